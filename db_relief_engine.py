@@ -0,0 +1,401 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Array-based building blocks for the distribution-based ReLiEF (db-ReLiEF) generators.
+# The generator scripts (db-ReLiEF-Fingerprint_generator.py and db-ReLiEF_Fingerprints_ColorAndDistance) call into this module so that the per-dot loops run as
+# NumPy array operations.
+import concurrent.futures
+import functools
+import math
+import os
+
+import matplotlib.colors
+import numpy as np
+
+from relief_vrml_parser import read_dot_surface
+from relief_instrumentation import instrument_stage, add_counter, update_maximum
+
+
+############################################################################################### RGB binning
+# The RGB values from the *.wrl file are fractions of one.  Each channel is binned in increments of 5 RGB units (0-255), which gives 52 bins per channel and
+# 52 x 52 x 52 = 140,608 color bins.  Bin index = red_bin * 52 * 52 + green_bin * 52 + blue_bin, the same order (and row number - 1) as the original
+# rgb_distribution_array.  A channel value falls into bin i when 5 * i / 255 <= value < 5 * (i + 1) / 255, and the bin edges are computed with the same
+# expression as before, so the bin found by a binary search on the edges is the bin the original linear scan stopped at.
+# Pure white (1, 1, 1) keeps its special case: it always goes into the first bin (#000000).
+
+rgb_bin_width = 5
+rgb_bins_per_channel = 52
+rgb_bin_count = rgb_bins_per_channel ** 3
+rgb_channel_edges = np.array([rgb_bin_width * rgb_edge_index / 255 for rgb_edge_index in range(0,rgb_bins_per_channel + 1)])
+rgb_unmatched_bin = -1 #<---------------------------------------------------------------------------------------- Dots outside every bin (negative or > 260/255 values) are not counted
+
+
+# Returns one bin index per dot color (rgb_unmatched_bin where the original scan found no bin).
+def rgb_bin_indices(dot_colors):
+        dot_colors = np.asarray(dot_colors, dtype=np.float64).reshape(-1, 3)
+        channel_bins = np.searchsorted(rgb_channel_edges, dot_colors, side="right") - 1
+        channel_matched = np.all((channel_bins >= 0) & (channel_bins < rgb_bins_per_channel) & ~np.isnan(dot_colors), axis=1)
+        bin_indices = (channel_bins[:, 0] * rgb_bins_per_channel + channel_bins[:, 1]) * rgb_bins_per_channel + channel_bins[:, 2]
+        bin_indices = np.where(channel_matched, bin_indices, rgb_unmatched_bin)
+        pure_white = np.all(dot_colors == 1, axis=1)
+        bin_indices[pure_white] = 0
+        return bin_indices
+
+
+# Match counts for all 140,608 color bins, as one int64 array.
+def rgb_bin_counts(dot_colors):
+        bin_indices = rgb_bin_indices(dot_colors)
+        return np.bincount(bin_indices[bin_indices != rgb_unmatched_bin], minlength=rgb_bin_count)
+
+
+# "PC&#rrggbb" label of a color bin.  The hex code is the bottom corner of the bin, as in the original rgb_distribution_array.  Labels are only built for bins
+# that are actually occupied and are cached after the first use.
+@functools.lru_cache(maxsize=None)
+def rgb_bin_label(rgb_bin_index):
+        rgb_red_value, rgb_remainder = divmod(rgb_bin_index, rgb_bins_per_channel * rgb_bins_per_channel)
+        rgb_green_value, rgb_blue_value = divmod(rgb_remainder, rgb_bins_per_channel)
+        rgb_red_fraction = rgb_bin_width * rgb_red_value / 255
+        rgb_green_fraction = rgb_bin_width * rgb_green_value / 255
+        rgb_blue_fraction = rgb_bin_width * rgb_blue_value / 255
+        return "PC&" + matplotlib.colors.to_hex([rgb_red_fraction, rgb_green_fraction, rgb_blue_fraction])
+
+
+# One bin string per occupied bin, in bin order: "label&1 label&2 ... label&n % % % % ".  The "% % % % " buffer ends each bin string.
+def bin_strings(bin_counts, bin_label):
+        output_fingerprint_bits = []
+        for bin_index in np.flatnonzero(bin_counts).tolist():
+                label = bin_label(bin_index)
+                output_fingerprint_bits.append("".join([label + "&" + str(bin_instance) + " " for bin_instance in range(1, int(bin_counts[bin_index]) + 1)]) + "% % % % ")
+        return output_fingerprint_bits
+
+
+############################################################################################### Pairwise-distance binning
+# Every pair of surface dots contributes its distance to one of 500 bins of 0.1 angstrom (0 to 50 angstroms).  Bin k covers bottom <= distance < top, with
+# bottom = round(k * 0.1, 1) and top = round(k * 0.1 + 0.1, 1) exactly as in the original distance_distribution_array; pairs 50 angstroms or more apart are
+# not counted.  The distances are computed in square tiles of dot pairs, so memory stays bounded by the tile size (per worker thread) however many dots
+# there are.  NumPy and math.dist() can differ in the last bit of a distance, so the pairs that lie within distance_edge_tolerance of a bin edge are
+# recomputed with math.dist() and the counts stay identical to the original double loop.
+
+distance_increment = 0.1
+distance_maximum = 50
+number_distance_bins = int(distance_maximum / distance_increment)
+distance_bin_bottoms = np.array([round(distance_bin_value * distance_increment,1) for distance_bin_value in range(0,number_distance_bins)])
+distance_bin_tops = np.array([round((distance_bin_value * distance_increment) + distance_increment,1) for distance_bin_value in range(0,number_distance_bins)])
+distance_unmatched_bin = -1
+distance_tile_size = 512 #<--------------------------------------------------------------------- Dots per tile side.  A tile holds 512 x 512 distances (2 MB of float64).
+distance_edge_tolerance = 1e-12 #<------------------------------------------------------------- Relative distance window around a bin edge that is recomputed with math.dist()
+distance_sample_size = 1000000 #<------------------------------------------------------------- Default number of random pairs for the sampled (approximate) histogram
+distance_confidence_z = 1.96 #<--------------------------------------------------------------- z value of the reported bounds (95% confidence)
+
+
+# Returns one bin index per distance (distance_unmatched_bin where no bin matches).  The bin is computed arithmetically as floor(distance / 0.1) and then moved
+# by one where the rounded bin edges disagree with the floating point division.  With near_edge=True a second boolean array marks the distances that lie
+# within distance_edge_tolerance (relative) of the bottom or top of their bin.
+def distance_bin_indices(distances, near_edge=False):
+        distances = np.asarray(distances, dtype=np.float64)
+        bin_indices = np.clip(np.floor(distances / distance_increment), 0, number_distance_bins - 1).astype(np.int64)
+        bin_indices -= (distances < distance_bin_bottoms[bin_indices]) & (bin_indices > 0)
+        bin_indices += (distances >= distance_bin_tops[bin_indices]) & (bin_indices < number_distance_bins - 1)
+        bin_bottoms = distance_bin_bottoms[bin_indices]
+        bin_tops = distance_bin_tops[bin_indices]
+        matched = (distances >= bin_bottoms) & (distances < bin_tops)
+        matched_indices = np.where(matched, bin_indices, distance_unmatched_bin)
+        if not near_edge:
+                return matched_indices
+        edge_window = distance_edge_tolerance * np.maximum(distances, distance_increment)
+        return matched_indices, (distances - bin_bottoms <= edge_window) | (bin_tops - distances <= edge_window)
+
+
+# "DS&<bottom>to<top>" label of a distance bin, as in the original distance_distribution_array.
+def distance_bin_label(distance_bin_index):
+        return "DS&" + str(round(distance_bin_index * distance_increment,1)) + "to" + str(round((distance_bin_index * distance_increment) + distance_increment,1))
+
+
+def _distance_tile_counts(dot_coordinates, coordinate_list, row_start, tile_size):
+        dot_count = len(dot_coordinates)
+        row_end = min(row_start + tile_size, dot_count)
+        tile_counts = np.zeros(number_distance_bins, dtype=np.int64)
+        for column_start in range(row_start, dot_count, tile_size):
+                column_end = min(column_start + tile_size, dot_count)
+                x_difference = dot_coordinates[row_start:row_end, 0, None] - dot_coordinates[None, column_start:column_end, 0]
+                y_difference = dot_coordinates[row_start:row_end, 1, None] - dot_coordinates[None, column_start:column_end, 1]
+                z_difference = dot_coordinates[row_start:row_end, 2, None] - dot_coordinates[None, column_start:column_end, 2]
+                tile_distances = np.sqrt(x_difference * x_difference + y_difference * y_difference + z_difference * z_difference)
+                if column_start == row_start: #<------------------------------------------------------ Diagonal tile: only the pairs with column > row
+                        pair_rows, pair_columns = np.triu_indices(row_end - row_start, k=1, m=column_end - column_start)
+                        tile_distances = tile_distances[pair_rows, pair_columns]
+                        pair_rows = pair_rows + row_start
+                        pair_columns = pair_columns + column_start
+                else:
+                        tile_distances = tile_distances.ravel()
+                        pair_rows = None
+                bin_indices, near_edge = distance_bin_indices(tile_distances, near_edge=True)
+                for pair_index in np.flatnonzero(near_edge).tolist():
+                        if pair_rows is None:
+                                first_dot, second_dot = divmod(pair_index, column_end - column_start)
+                                first_dot += row_start
+                                second_dot += column_start
+                        else:
+                                first_dot = int(pair_rows[pair_index])
+                                second_dot = int(pair_columns[pair_index])
+                        bin_indices[pair_index] = distance_bin_indices([math.dist(coordinate_list[first_dot], coordinate_list[second_dot])])[0]
+                tile_counts += np.bincount(bin_indices[bin_indices != distance_unmatched_bin], minlength=number_distance_bins)
+        return tile_counts
+
+
+# Exact pair counts for the 500 distance bins.  Row tiles are shared out to a pool of worker threads (NumPy releases the GIL inside the array operations) and
+# each worker returns its own counts, which are summed at the end.  workers=None uses one thread per CPU core.
+def pairwise_distance_bin_counts(dot_coordinates, tile_size=distance_tile_size, workers=None):
+        dot_coordinates = np.ascontiguousarray(dot_coordinates, dtype=np.float64).reshape(-1, 3)
+        coordinate_list = dot_coordinates.tolist()
+        row_starts = range(0, len(dot_coordinates), tile_size)
+        if workers is None:
+                workers = os.cpu_count() or 1
+        distance_counts = np.zeros(number_distance_bins, dtype=np.int64)
+        if workers <= 1 or len(row_starts) <= 1:
+                for row_start in row_starts:
+                        distance_counts += _distance_tile_counts(dot_coordinates, coordinate_list, row_start, tile_size)
+                return distance_counts
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                for tile_counts in executor.map(lambda row_start: _distance_tile_counts(dot_coordinates, coordinate_list, row_start, tile_size), row_starts):
+                        distance_counts += tile_counts
+        return distance_counts
+
+
+# Approximate pair counts from sample_size random dot pairs (drawn uniformly, with replacement, among the n * (n - 1) / 2 pairs).  Returns three int64 arrays:
+# the estimated counts (rounded to whole pairs) and the lower and upper bounds of the Wilson score interval at confidence_z, scaled to the total number of
+# pairs.  When sample_size is at least the number of pairs the exact counts are returned, with bounds equal to the counts.
+def sampled_distance_bin_counts(dot_coordinates, sample_size=distance_sample_size, confidence_z=distance_confidence_z, seed=None):
+        dot_coordinates = np.ascontiguousarray(dot_coordinates, dtype=np.float64).reshape(-1, 3)
+        dot_count = len(dot_coordinates)
+        total_pairs = dot_count * (dot_count - 1) // 2
+        if total_pairs <= sample_size:
+                distance_counts = pairwise_distance_bin_counts(dot_coordinates)
+                return distance_counts, distance_counts.copy(), distance_counts.copy()
+        random_generator = np.random.default_rng(seed)
+        first_dots = random_generator.integers(0, dot_count, size=sample_size)
+        second_dots = (first_dots + random_generator.integers(1, dot_count, size=sample_size)) % dot_count #<------- Never the same dot twice
+        sampled_distances = np.sqrt(((dot_coordinates[first_dots] - dot_coordinates[second_dots]) ** 2).sum(axis=1))
+        bin_indices = distance_bin_indices(sampled_distances)
+        sampled_fractions = np.bincount(bin_indices[bin_indices != distance_unmatched_bin], minlength=number_distance_bins) / sample_size
+        z_squared = confidence_z * confidence_z
+        interval_center = (sampled_fractions + z_squared / (2 * sample_size)) / (1 + z_squared / sample_size)
+        interval_half_width = confidence_z / (1 + z_squared / sample_size) * np.sqrt(sampled_fractions * (1 - sampled_fractions) / sample_size + z_squared / (4 * sample_size * sample_size))
+        estimated_counts = np.rint(sampled_fractions * total_pairs).astype(np.int64)
+        lower_counts = np.floor(np.clip(interval_center - interval_half_width, 0, 1) * total_pairs).astype(np.int64)
+        upper_counts = np.ceil(np.clip(interval_center + interval_half_width, 0, 1) * total_pairs).astype(np.int64)
+        return estimated_counts, lower_counts, upper_counts
+
+
+# This is the original pairwise double loop and linear bin scan.  It is kept as the reference that pairwise_distance_bin_counts() is checked against.
+def distance_bin_counts_reference(pairwise_distance_array):
+        distance_counts = [0] * number_distance_bins
+        pairwise_distance_array_size = len(pairwise_distance_array)
+        for distance_outer_loop in range(0,pairwise_distance_array_size):
+                for distance_inner_loop in range(distance_outer_loop + 1,pairwise_distance_array_size):
+                        dot_pairwise_distance = math.dist(pairwise_distance_array[distance_outer_loop],pairwise_distance_array[distance_inner_loop])
+                        for distance_bin_index in range(0,number_distance_bins):
+                                if dot_pairwise_distance >= round(distance_bin_index * distance_increment,1) and dot_pairwise_distance < round((distance_bin_index * distance_increment) + distance_increment,1):
+                                        distance_counts[distance_bin_index] += 1
+                                        break
+        return distance_counts
+
+
+# Equivalence test between pairwise_distance_bin_counts() and the reference loop.  Returns the number of dot pairs compared and raises an AssertionError on
+# any mismatch.
+def check_distance_histogram_equivalence(dot_coordinates, tile_size=distance_tile_size, workers=None):
+        vectorized_counts = pairwise_distance_bin_counts(dot_coordinates, tile_size, workers).tolist()
+        reference_counts = distance_bin_counts_reference(np.asarray(dot_coordinates, dtype=np.float64).reshape(-1, 3).tolist())
+        for distance_bin_index in range(0,number_distance_bins):
+                assert vectorized_counts[distance_bin_index] == reference_counts[distance_bin_index], f"Bin {distance_bin_label(distance_bin_index)} differs: {vectorized_counts[distance_bin_index]} (vectorized) vs {reference_counts[distance_bin_index]} (reference)"
+        return len(dot_coordinates) * (len(dot_coordinates) - 1) // 2
+
+
+############################################################################################### Property channels
+# A property channel turns the dots of a surface into bin counts of one property.  Channels are registered by their property code, which is also the first
+# part of their bit labels:
+#   PC  partial charge: the dot colors in the 140,608 RGB bins ("PC&#rrggbb")
+#   DS  pair distance: the distances between all dot pairs in 500 bins of 0.1 angstrom ("DS&<bottom>to<top>")
+#   CM  distance from the center of mass: the distance of every dot from the centroid of the dots, in the same 500 bins as DS ("CM&<bottom>to<top>")
+#   HY, FG  hydrophobicity and functional group: the dot colors of a surface colored by that property, in the RGB bins ("HY&#rrggbb", "FG&#rrggbb")
+# register_property_channel() adds a channel: bin_counts(dot_coordinates, dot_colors, channel_options) returns an int64 array of counts and bin_label(bin_index)
+# the label of a bin.  register_color_property_channel() adds another color-coded property under its own code.  channel_options holds the engine settings
+# (distance_histogram_mode, distance_sample_size, distance_workers) and the instrumentation record of the run, which may be None.
+
+db_property_channels = {}
+
+
+def register_property_channel(property_code, bin_counts, bin_label):
+        db_property_channels[property_code] = {"bin_counts": bin_counts, "bin_label": bin_label}
+
+
+def _color_channel_counts(dot_coordinates, dot_colors, channel_options):
+        return rgb_bin_counts(dot_colors)
+
+
+def _pair_distance_channel_counts(dot_coordinates, dot_colors, channel_options):
+        if channel_options.get("distance_histogram_mode", "exact") == "sampled":
+                distance_bin_matches, distance_bin_lower, distance_bin_upper = sampled_distance_bin_counts(dot_coordinates, channel_options.get("distance_sample_size", distance_sample_size))
+                update_maximum(channel_options.get("instrumentation"), "distance_bound_width_pairs", int((distance_bin_upper - distance_bin_lower).max(initial=0))) #<------- Widest 95% Wilson interval of a sampled bin
+                return distance_bin_matches
+        return pairwise_distance_bin_counts(dot_coordinates, workers=channel_options.get("distance_workers"))
+
+
+def _center_distance_channel_counts(dot_coordinates, dot_colors, channel_options):
+        dot_coordinates = np.asarray(dot_coordinates, dtype=np.float64).reshape(-1, 3)
+        if len(dot_coordinates) == 0:
+                return np.zeros(number_distance_bins, dtype=np.int64)
+        bin_indices = distance_bin_indices(np.linalg.norm(dot_coordinates - dot_coordinates.mean(axis=0), axis=1))
+        return np.bincount(bin_indices[bin_indices != distance_unmatched_bin], minlength=number_distance_bins)
+
+
+def _center_distance_bin_label(distance_bin_index):
+        return "CM" + distance_bin_label(distance_bin_index)[2:]
+
+
+def register_color_property_channel(property_code):
+        register_property_channel(property_code, _color_channel_counts, functools.lru_cache(maxsize=None)(lambda rgb_bin_index: property_code + rgb_bin_label(rgb_bin_index)[2:]))
+
+
+register_property_channel("PC", _color_channel_counts, rgb_bin_label)
+register_property_channel("DS", _pair_distance_channel_counts, distance_bin_label)
+register_property_channel("CM", _center_distance_channel_counts, _center_distance_bin_label)
+register_color_property_channel("HY")
+register_color_property_channel("FG")
+
+
+############################################################################################### Per-structure fingerprints
+# Bin string layout:  PC&#ffa000&1 PC&#ffa000&2 ... PC&#ffa000&6 % % % %   (property & bin & match instance, then a four-bit "% % % % " buffer per bin)
+# The functions below return (output_fingerprint_string, number_bins_matched, fingerprint_length_with_delimiter) for one molecule, parsed by surface_reader.
+# The fingerprint row of the molecule is name + "," + color + "," + output_fingerprint_string.
+
+
+# Binning parameters of the db-ReLiEF fingerprints.  They are part of the cache key of a fingerprint (see relief_cache.py), so bump fingerprint_version
+# whenever the fingerprint changes for another reason.  Version 2: the ColorAndDistance fingerprint no longer repeats the PC section before the DS section.
+db_fingerprint_parameters = {"fingerprint_version": 2,
+                             "rgb_bin_width": rgb_bin_width, "rgb_bins_per_channel": rgb_bins_per_channel,
+                             "distance_increment": distance_increment, "distance_maximum": distance_maximum}
+
+
+# Fingerprint of the property_channels of one molecule, in property -> bin -> instance order.  Every channel reads dot_surface_file, unless property_surfaces
+# names another surface for it (for example {"HY": "5sdu_hydrophobicity.wrl"}).  Each surface file is parsed once, however many channels use it, and all
+# channels bin the same dot arrays.  With an instrumentation record (see relief_instrumentation.py) the parse, bin and emit stages are timed and the dots,
+# occupied bins per property and fingerprint lengths are recorded.
+def generate_db_property_fingerprint(dot_surface_file, property_channels=("PC",), property_surfaces=None, surface_reader=read_dot_surface, distance_histogram_mode="exact",
+                                     distance_sample_size=distance_sample_size, distance_workers=None, instrumentation=None):
+        unknown_channels = [property_code for property_code in property_channels if property_code not in db_property_channels]
+        if unknown_channels:
+                raise ValueError(f"Unknown property channels: {', '.join(unknown_channels)}")
+        property_surfaces = property_surfaces or {}
+        channel_options = {"distance_histogram_mode": distance_histogram_mode, "distance_sample_size": distance_sample_size, "distance_workers": distance_workers, "instrumentation": instrumentation}
+        parsed_surfaces = {}
+        output_fingerprint_bits = []
+        fingerprint_length_with_delimiter = 0
+        for property_code in property_channels:
+                channel_surface_file = property_surfaces.get(property_code, dot_surface_file)
+                if channel_surface_file not in parsed_surfaces:
+                        with instrument_stage(instrumentation, "parse"):
+                                parsed_surfaces[channel_surface_file] = surface_reader(channel_surface_file)
+                        add_counter(instrumentation, "dots", len(parsed_surfaces[channel_surface_file][0]))
+                        update_maximum(instrumentation, "dots_per_file", len(parsed_surfaces[channel_surface_file][0]))
+                dot_coordinates, dot_colors = parsed_surfaces[channel_surface_file]
+                property_channel = db_property_channels[property_code]
+                with instrument_stage(instrumentation, "bin", len(dot_coordinates)):
+                        channel_bin_matches = property_channel["bin_counts"](dot_coordinates, dot_colors, channel_options)
+                with instrument_stage(instrumentation, "emit"):
+                        channel_fingerprint_bits = bin_strings(channel_bin_matches, property_channel["bin_label"])
+                output_fingerprint_bits += channel_fingerprint_bits
+                fingerprint_length_with_delimiter += int(channel_bin_matches.sum())
+                add_counter(instrumentation, property_code + "_bins_occupied", len(channel_fingerprint_bits))
+        number_bins_matched = len(output_fingerprint_bits)
+        fingerprint_length_with_delimiter += number_bins_matched * 4 #<-------------------------- The number_bins_matched is multiplied by 4 to account for buffers
+        add_counter(instrumentation, "surfaces")
+        update_maximum(instrumentation, "longest_fingerprint_length", fingerprint_length_with_delimiter)
+        with instrument_stage(instrumentation, "emit"):
+                output_fingerprint_string = "".join(output_fingerprint_bits)
+        return output_fingerprint_string, number_bins_matched, fingerprint_length_with_delimiter
+
+
+# Color (partial charge) distribution fingerprint, as written by db-ReLiEF-Fingerprint_generator.py.
+def generate_db_fingerprint(dot_surface_file, surface_reader=read_dot_surface, instrumentation=None):
+        return generate_db_property_fingerprint(dot_surface_file, ("PC",), surface_reader=surface_reader, instrumentation=instrumentation)
+
+
+# Color and pair-distance distribution fingerprint, as written by db-ReLiEF_Fingerprints_ColorAndDistance: the PC bin strings followed by the DS bin strings.
+# distance_histogram_mode is "exact" or "sampled".
+def generate_db_color_distance_fingerprint(dot_surface_file, distance_histogram_mode="exact", distance_sample_size=distance_sample_size, distance_workers=None, surface_reader=read_dot_surface, instrumentation=None):
+        return generate_db_property_fingerprint(dot_surface_file, ("PC", "DS"), surface_reader=surface_reader, distance_histogram_mode=distance_histogram_mode,
+                                                distance_sample_size=distance_sample_size, distance_workers=distance_workers, instrumentation=instrumentation)
+
+
+# number_bins_matched and fingerprint_length_with_delimiter of an output_fingerprint_string, for fingerprints that are read back from the cache.
+def db_fingerprint_statistics(output_fingerprint_string):
+        fingerprint_bits = output_fingerprint_string.split()
+        return fingerprint_bits.count("%") // 4, len(fingerprint_bits) #<-------------------------------- Every bin string ends in a "% % % % " buffer
+
+
+# This is the original table and linear scan.  They are kept as the reference that rgb_bin_indices() is checked against.
+def rgb_distribution_array_reference():
+        rgb_distribution_array = []
+        rgb_distribution_row_count = 0
+        for rgb_red_value in range(0,52):
+                for rgb_green_value in range(0,52):
+                        for rgb_blue_value in range(0,52):
+                                rgb_distribution_row_count += 1
+                                rgb_red_fraction = 5 * rgb_red_value / 255
+                                rgb_green_fraction = 5 * rgb_green_value / 255
+                                rgb_blue_fraction = 5 * rgb_blue_value / 255
+                                rgb_red_top = 5 * (rgb_red_value + 1) / 255
+                                rgb_green_top = 5 * (rgb_green_value + 1) / 255
+                                rgb_blue_top = 5 * (rgb_blue_value + 1) / 255
+                                rgb_bin_string = "PC&" + matplotlib.colors.to_hex([rgb_red_fraction, rgb_green_fraction, rgb_blue_fraction])
+                                rgb_distribution_array.append([rgb_distribution_row_count,rgb_red_fraction,rgb_green_fraction,rgb_blue_fraction,rgb_bin_string,0,rgb_red_top,rgb_green_top,rgb_blue_top])
+        return rgb_distribution_array
+
+
+def rgb_bin_index_reference(rgb_distribution_array, first_color_value, second_color_value, third_color_value):
+        for rgb_bin_count in range(0,len(rgb_distribution_array)):
+                if first_color_value == 1 and second_color_value == 1 and third_color_value == 1:
+                        return rgb_bin_count
+                elif first_color_value >= rgb_distribution_array[rgb_bin_count][1] and second_color_value >= rgb_distribution_array[rgb_bin_count][2] and third_color_value >= rgb_distribution_array[rgb_bin_count][3] and first_color_value < rgb_distribution_array[rgb_bin_count][6] and second_color_value < rgb_distribution_array[rgb_bin_count][7] and third_color_value < rgb_distribution_array[rgb_bin_count][8]:
+                        return rgb_bin_count
+        return rgb_unmatched_bin
+
+
+# Equivalence test between rgb_bin_indices()/rgb_bin_label() and the reference table and scan.  Returns the number of dot colors compared and raises an
+# AssertionError on any mismatch.
+def check_rgb_binning_equivalence(dot_colors):
+        rgb_distribution_array = rgb_distribution_array_reference()
+        for rgb_bin_index in range(0,rgb_bin_count):
+                assert rgb_bin_label(rgb_bin_index) == rgb_distribution_array[rgb_bin_index][4], f"Label of bin {rgb_bin_index} differs: {rgb_bin_label(rgb_bin_index)} vs {rgb_distribution_array[rgb_bin_index][4]}"
+        vectorized_indices = rgb_bin_indices(dot_colors).tolist()
+        for dot_index, dot_color in enumerate(np.asarray(dot_colors, dtype=np.float64).reshape(-1, 3).tolist()):
+                reference_index = rgb_bin_index_reference(rgb_distribution_array, *dot_color)
+                assert vectorized_indices[dot_index] == reference_index, f"Dot {dot_index} {dot_color} differs: bin {vectorized_indices[dot_index]} (vectorized) vs {reference_index} (reference)"
+        return len(vectorized_indices)
+
+
+if __name__ == "__main__": #<-------------------------------------------------------------------------- Run the equivalence tests on random colors and dot clouds
+        random_generator = np.random.default_rng(2023)
+        test_dot_colors = np.concatenate((random_generator.uniform(0, 1, size=(300, 3)).round(4),
+                                          rgb_channel_edges[random_generator.integers(0, rgb_bins_per_channel + 1, size=(100, 3))],
+                                          [[1, 1, 1], [1, 0.5, 1], [-0.1, 0.2, 0.3], [1.1, 0, 0], [0, 0, 0]]))
+        compared_colors = check_rgb_binning_equivalence(test_dot_colors)
+        print(f"rgb_bin_indices() matches the reference scan on {compared_colors} dot colors")
+        test_dot_coordinates = np.concatenate((random_generator.normal(0, 12, size=(700, 3)).round(6), random_generator.integers(-20, 20, size=(100, 3)) * 0.1))
+        compared_pairs = check_distance_histogram_equivalence(test_dot_coordinates, tile_size=128, workers=4)
+        print(f"pairwise_distance_bin_counts() matches the reference loop on {compared_pairs} dot pairs")
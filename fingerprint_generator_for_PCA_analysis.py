@@ -1,59 +1,43 @@
-import numpy as np
-import sklearn
-from sklearn.decomposition import PCA
-from scipy.sparse import coo_matrix
 import scoria
-import mdtraj as md
 
-traj = md.load('/Users/benjaminsamudio/3w32-benzene_NPT_production_2024sep13utc045116_transformed_skip_0.xtc', top='/Users/benjaminsamudio/3w32-benzene_NPT_production_2024sep13utc045116_transformed_skip_0.pdb')
-pocket = scoria.Molecule()
-platform = scoria.Molecule()
-pocket.load_pdb_into("/Users/benjaminsamudio/Desktop/EGFR_inactiveState_pocketOfInterest.pdb")
-platform.load_pdb_into("/Users/benjaminsamudio/Desktop/Ne_atom_grid_0p50_angstrom_spacing_2d_testing.pdb")
+from trajectory_relief_engine import platform_slice_coordinates, pocket_contact_mask, fingerprint_trajectory_chunks
+from trajectory_relief_engine import load_frame_chunk, fit_streaming_pca, project_frame_chunk
+from relief_instrumentation import new_instrumentation, instrument_stage, write_instrumentation
 
-translation_vector = np.array([0,0,-0.5])
-reset_vector = np.array([0,0,25])
-for frame in range(1,int(traj.n_frames)+1):
-        single_frame = traj[frame]
-        single_frame.save_pdb('single_frame.pdb')
-        protein = scoria.Molecule()
-        protein.load_pdb_into("single_frame.pdb")
-        print(f"Operating on frame: {frame}")
-        row = []
-        column = []
-        value = []
-        for i in range(0,50):
-                platform.translate_molecule(translation_vector)
-                platform_clash_protein = platform.select_close_atoms_from_different_molecules(protein,1.8)
-                platform_avoid_protein = platform.invert_selection(platform_clash_protein[0])
-                new_mol = scoria.Molecule()
-                new_mol =  platform.get_molecule_from_selection(platform_avoid_protein)
-                close_reference_pocket = new_mol.select_close_atoms_from_different_molecules(pocket,0.6)
-                if len(close_reference_pocket[0]) > 0:
-                        for j in list(close_reference_pocket[0]):
-                                row.append(int(frame))
-                                column.append(i*1600+j)
-                                value.append(1)
-        print(row)
-        print(column)
-        print(value)
-        platform.translate_molecule(reset_vector)
+trajectory_file = '/Users/benjaminsamudio/3w32-benzene_NPT_production_2024sep13utc045116_transformed_skip_0.xtc'
+topology_file = '/Users/benjaminsamudio/3w32-benzene_NPT_production_2024sep13utc045116_transformed_skip_0.pdb'
+trajectory_chunk_size = 100 #<------ Frames per chunk: one worker task and one sparse chunk file
+chunk_directory = "trajectory_fingerprint_chunks" #<------ Sparse per-frame bits, one *.npz file per chunk of frames.  Finished chunks are not computed again when the script is restarted with the same inputs (see trajectory_relief_engine.py)
+trajectory_workers = None #<------ Worker processes (None: one per CPU core, 1: no worker processes)
+pca_components = 2
+projections_filename = "trajectory_fingerprint_projections.csv" #<------ One "frame,PC1,PC2" row per frame
+instrumentation_filename = "trajectory_fingerprint_instrumentation.json" #<------ Stage times (parse, slice, bin, write, pca, emit) and frame / bit counters.  A name ending in ".prom" writes the Prometheus textfile format
 
+if __name__ == "__main__": #<------ The worker processes import this file, they must not run it
+        pocket = scoria.Molecule()
+        platform = scoria.Molecule()
+        pocket.load_pdb_into("/Users/benjaminsamudio/Desktop/EGFR_inactiveState_pocketOfInterest.pdb")
+        platform.load_pdb_into("/Users/benjaminsamudio/Desktop/Ne_atom_grid_0p50_angstrom_spacing_2d_testing.pdb")
 
-row_array = np.array([3,10,12,15]) #<----- max 16
-column_array = np.array([4,10,30,32]) #<------ max 33
-data_array = np.array([1,1,1,1])
+        instrumentation = new_instrumentation("pca")
+        slice_coordinates = platform_slice_coordinates(platform.get_coordinates())
+        contact_mask = pocket_contact_mask(slice_coordinates, pocket.get_coordinates()) #<------ The pocket is only indexed once per run
+        chunk_filenames = []
+        for chunk_filename in fingerprint_trajectory_chunks(trajectory_file, topology_file, slice_coordinates, contact_mask, chunk_directory, trajectory_chunk_size, first_frame=1, workers=trajectory_workers,
+                                                            instrumentation=instrumentation, pocket_coordinates=pocket.get_coordinates()):
+                chunk_filenames.append(chunk_filename) #<------ Chunks arrive in frame order; the frames and set bits are counted in the instrumentation record
 
-print(row_array)
-print(column_array)
-print(data_array)
 
-sparse_matrix = coo_matrix((data_array, (row_array, column_array)), shape=(16, 33))
-print(sparse_matrix)
-dense_matrix = sparse_matrix.toarray()
-pca = PCA(n_components=2)  # Extract the top 2 principal components
-transformed_data = pca.fit_transform(dense_matrix)
-for i in range(0,len(transformed_data)):
-        print(f"{transformed_data[i][0]},{transformed_data[i][1]}")
+############################################################################################### PCA, one chunk of frames at a time
 
-print(transformed_data)
+        with instrument_stage(instrumentation, "pca", len(chunk_filenames)):
+                pca = fit_streaming_pca(lambda: (load_frame_chunk(chunk_filename)[1] for chunk_filename in chunk_filenames), pca_components) #<------ Extract the top 2 principal components
+        with open(projections_filename, 'w') as file_object:
+                file_object.write("frame," + ",".join(f"PC{component_index + 1}" for component_index in range(pca_components)) + "\n")
+                for chunk_filename in chunk_filenames:
+                        with instrument_stage(instrumentation, "emit"):
+                                frame_indices, frame_matrix = load_frame_chunk(chunk_filename)
+                                transformed_data = project_frame_chunk(pca, frame_matrix)
+                                file_object.write("".join(f"{frame}," + ",".join(str(projection) for projection in transformed_data[frame_position]) + "\n" for frame_position, frame in enumerate(frame_indices.tolist())))
+        print(f"Projections of {pca['frame_count']} frames written to {projections_filename}")
+        write_instrumentation(instrumentation, instrumentation_filename)
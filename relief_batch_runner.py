@@ -0,0 +1,296 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Batch driver that fingerprints every *.wrl surface of an input directory on a pool of worker processes.
+#
+#   python relief_batch_runner.py sb          INPUT_DIRECTORY OUTPUT_DIRECTORY --workers 8
+#   python relief_batch_runner.py db          INPUT_DIRECTORY OUTPUT_DIRECTORY --workers 8
+#   python relief_batch_runner.py db-distance INPUT_DIRECTORY OUTPUT_DIRECTORY --workers 8 --colors activities.csv
+#   python relief_batch_runner.py db-properties INPUT_DIRECTORY OUTPUT_DIRECTORY --properties PC,DS,CM,HY --property-surface HY=_hydrophobicity
+#
+# "sb" writes the same fingerprints as sb-ReLiEF-Fingerprint_generator.py into OUTPUT_DIRECTORY, "db" the ones of db-ReLiEF-Fingerprint_generator.py and
+# "db-distance" the ones of db-ReLiEF_Fingerprints_ColorAndDistance.  "db-properties" fingerprints the --properties channels of db_relief_engine.py in
+# one pass; a --property-surface CODE=SUFFIX channel reads <name>SUFFIX.wrl instead of <name>.wrl, and those files are not fingerprinted on their own.  The sb-ReLiEF diagnostic files are only written with --diagnostics text or binary.
+# The fingerprint rows are written in sorted file name order, whatever order the workers finish in.  A surface that fails is recorded in the failures file
+# (name and error) and the run carries on with the other surfaces.  The optional --colors file is a CSV with Name and Color columns (for example activities);
+# surfaces that are not listed get "FILL_ME" as their color, as in the generator scripts.  With --format npz the fingerprints are saved as a sparse archive
+# (see relief_fingerprint_format.py) instead of the CSV file.  With --cache DIR, surfaces whose content and fingerprint parameters did not change since an
+# earlier run are read from the cache (see relief_cache.py), so adding a few new surfaces to a large library only fingerprints the new ones.  With
+# --instrumentation FILE the stage times and counters of all workers are saved (JSON or Prometheus textfile, see relief_instrumentation.py), and
+# --profile NAME runs the one surface NAME under the sampling profiler.  With --blanket-bounds mesh or library, "sb" only sweeps the blanket window of each
+# surface, or the one window that holds every surface of the input directory (see sb_relief_engine.py); the fingerprints then start with the window token.
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import functools
+import os
+import sys
+
+from relief_vrml_parser import read_indexed_face_set, read_dot_surface
+from sb_relief_engine import generate_sb_fingerprint, diagnostic_output_modes, sb_fingerprint_parameters, blanket_bounds_modes, library_blanket_window
+from db_relief_engine import generate_db_fingerprint, generate_db_color_distance_fingerprint, generate_db_property_fingerprint, db_fingerprint_parameters
+from relief_cache import surface_content_digests, cache_key, get_cached_fingerprint, put_cached_fingerprint, read_surface_cached, read_surface_cached_with_digests, evict_cache, parse_cache_size, default_cache_size
+from relief_fingerprint_format import encode_fingerprint, save_fingerprint_archive, placeholder_tokens
+from relief_instrumentation import new_instrumentation, instrument_stage, add_counter, merge_instrumentation, sampling_profiler, write_instrumentation
+
+fingerprints_filenames = {"sb": "ReLieF_Fingerprints.csv", "db": "ReLieF_Fingerprints_DistributionBased.csv", "db-distance": "ReLieF_Fingerprints_DistributionBased.csv",
+                         "db-properties": "ReLieF_Fingerprints_DistributionBased.csv"}
+failures_filename = "ReLieF_Fingerprints_failures.csv"
+profile_filename_prefix = "ReLieF_Profile_"
+default_color = "FILL_ME"
+default_property_channels = ("PC", "DS")
+pending_surfaces_per_worker = 4 #<------------------------------------------------------------ Surfaces queued per worker.  Bounds the finished rows held back while an earlier surface is still running.
+
+
+# Fingerprint row (without the newline) of one surface.  This runs inside the worker processes.  With a cache_directory the parsed surface arrays are
+# cached as well (see relief_cache.py), under the content_digests the main process already computed for the fingerprint key (surface file -> digest).
+# property_settings is the (property_channels, property_surface_suffixes) pair of "db-properties".  The stages and counters are recorded in instrumentation,
+# if given (see relief_instrumentation.py).  blanket_bounds is the "sb" blanket_bounds of generate_sb_fingerprint().
+def fingerprint_surface(fingerprint_kind, surface_file, output_directory, color=default_color, diagnostic_outputs="none", cache_directory=None, property_settings=None, instrumentation=None,
+                        blanket_bounds="full", content_digests=None):
+        output_filename_base = os.path.splitext(os.path.basename(surface_file))[0]
+        surface_reader = read_indexed_face_set if fingerprint_kind == "sb" else read_dot_surface
+        if cache_directory:
+                surface_reader = functools.partial(read_surface_cached_with_digests, cache_directory, surface_reader, content_digests or {})
+        if fingerprint_kind == "sb":
+                return generate_sb_fingerprint(surface_file, output_directory, color, verbose=False, diagnostic_outputs=diagnostic_outputs, surface_reader=surface_reader, instrumentation=instrumentation,
+                                               blanket_bounds=blanket_bounds)
+        if fingerprint_kind == "db":
+                output_fingerprint_string, number_bins_matched, fingerprint_length_with_delimiter = generate_db_fingerprint(surface_file, surface_reader=surface_reader, instrumentation=instrumentation)
+        elif fingerprint_kind == "db-distance":
+                output_fingerprint_string, number_bins_matched, fingerprint_length_with_delimiter = generate_db_color_distance_fingerprint(surface_file, distance_workers=1, surface_reader=surface_reader, #<------- One thread per process, the processes already use every core
+                                                                                                                                           instrumentation=instrumentation)
+        elif fingerprint_kind == "db-properties":
+                property_channels, property_surface_suffixes = property_settings or (default_property_channels, {})
+                property_surfaces = {property_code: os.path.join(os.path.dirname(surface_file), output_filename_base + surface_suffix + ".wrl") for property_code, surface_suffix in property_surface_suffixes.items()}
+                output_fingerprint_string, number_bins_matched, fingerprint_length_with_delimiter = generate_db_property_fingerprint(surface_file, property_channels, property_surfaces, surface_reader, distance_workers=1,
+                                                                                                                                     instrumentation=instrumentation)
+        else:
+                raise ValueError(f"Unknown fingerprint kind: {fingerprint_kind}")
+        return output_filename_base + "," + color + "," + output_fingerprint_string
+
+
+# fingerprint_surface() with its own instrumentation record, which is sent back to the main process with the fingerprint row.  With a profile_filename the
+# surface runs under the sampling profiler.
+def _fingerprint_surface_instrumented(fingerprint_kind, surface_file, output_directory, color, diagnostic_outputs, cache_directory, property_settings, blanket_bounds, content_digests, profile_filename):
+        instrumentation = new_instrumentation(fingerprint_kind)
+        with sampling_profiler(profile_filename) if profile_filename else contextlib.nullcontext():
+                fingerprint_row = fingerprint_surface(fingerprint_kind, surface_file, output_directory, color, diagnostic_outputs, cache_directory, property_settings, instrumentation, blanket_bounds,
+                                                      content_digests)
+        return fingerprint_row, instrumentation
+
+
+# Everything besides the surface content that a fingerprint depends on.  The generator scripts use the same parameters, so the script and batch runner
+# outputs share cache entries.  Full-blanket "sampler" fingerprints and "exact" distance histograms keep the key they had before these options existed.
+def fingerprint_key_parameters(fingerprint_kind, property_settings=None, blanket_bounds="full", column_hit_engine="sampler", distance_histogram_mode="exact", distance_sample_size=None):
+        if fingerprint_kind == "sb":
+                key_parameters = {"fingerprint_kind": fingerprint_kind, "column_hit_engine": column_hit_engine, **sb_fingerprint_parameters}
+                if blanket_bounds != "full":
+                        key_parameters.update(blanket_bounds=blanket_bounds)
+        else:
+                key_parameters = {"fingerprint_kind": fingerprint_kind, "distance_histogram_mode": distance_histogram_mode, **db_fingerprint_parameters}
+                if distance_histogram_mode != "exact":
+                        key_parameters.update(distance_sample_size=distance_sample_size)
+        if fingerprint_kind == "db-properties":
+                property_channels, property_surface_suffixes = property_settings or (default_property_channels, {})
+                key_parameters.update(property_channels=list(property_channels), property_surface_suffixes=dict(sorted(property_surface_suffixes.items())))
+        return key_parameters
+
+
+# Cache key of a fingerprint: the surface content plus everything that the fingerprint depends on.
+# For "db-properties" the content of the property surfaces is part of content_digest (see fingerprint_surface_files()).
+def fingerprint_cache_key(fingerprint_kind, content_digest, property_settings=None, blanket_bounds="full"):
+        return cache_key(content_digest, fingerprint_key_parameters(fingerprint_kind, property_settings, blanket_bounds))
+
+
+# The files a fingerprint is read from: the surface, then the property surfaces of "db-properties" in suffix order.
+def fingerprint_surface_files(surface_path, property_settings=None):
+        surface_base = os.path.splitext(surface_path)[0]
+        return [surface_path] + [surface_base + surface_suffix + ".wrl" for property_code, surface_suffix in sorted((property_settings[1] if property_settings else {}).items())]
+
+
+def read_color_table(colors_filename):
+        with open(colors_filename, newline="") as file_object:
+                return {color_row["Name"]: color_row["Color"] for color_row in csv.DictReader(file_object)}
+
+
+# The *.wrl files of input_directory, without the property surfaces (names ending in one of property_surface_suffixes), which are read with their molecule.
+def list_surface_files(input_directory, property_surface_suffixes=None):
+        property_surface_suffixes = tuple((property_surface_suffixes or {}).values())
+        return sorted(surface_file for surface_file in os.listdir(input_directory) if surface_file.endswith(".wrl") and not (property_surface_suffixes and os.path.splitext(surface_file)[0].endswith(property_surface_suffixes)))
+
+
+def _submit_surface(executor, surface_function, surface_arguments):
+        if executor is not None:
+                return executor.submit(surface_function, *surface_arguments)
+        surface_future = concurrent.futures.Future() #<------------------------------------------------ workers=1: fingerprint the surface in this process
+        try:
+                surface_future.set_result(surface_function(*surface_arguments))
+        except Exception as error:
+                surface_future.set_exception(error)
+        return surface_future
+
+
+# Yields (surface_file, fingerprint_row, error) in surface_files order.  Exactly one of fingerprint_row and error is None.  With a cache_directory, surfaces
+# whose content and parameters are unchanged are read from the cache instead of being fingerprinted (not when diagnostic files are requested, since
+# those are only written when the surface is fingerprinted).  The stages and counters of the workers are merged into instrumentation, if given, and the
+# surface named profile_surface (file name with or without the extension) runs under the sampling profiler.
+def fingerprint_surfaces(fingerprint_kind, input_directory, output_directory, surface_files, color_table, workers, diagnostic_outputs="none", cache_directory=None, instrumentation=None, profile_surface=None,
+                         property_settings=None, blanket_bounds="full"):
+        use_fingerprint_cache = cache_directory is not None and diagnostic_outputs == "none"
+
+        def start_surface(executor, surface_file):
+                surface_path = os.path.join(input_directory, surface_file)
+                name = os.path.splitext(surface_file)[0]
+                color = color_table.get(name, default_color)
+                key = None
+                content_digests = None
+                try:
+                        if use_fingerprint_cache:
+                                content_digests, content_digest = surface_content_digests(fingerprint_surface_files(surface_path, property_settings)) #<------- Each file is hashed once, here
+                                key = fingerprint_cache_key(fingerprint_kind, content_digest, property_settings, blanket_bounds)
+                                cached_fingerprint_string = get_cached_fingerprint(cache_directory, key)
+                                if cached_fingerprint_string is not None:
+                                        add_counter(instrumentation, "cache_hits")
+                                        return surface_file, None, name + "," + color + "," + cached_fingerprint_string, None
+                except Exception as error:
+                        return surface_file, None, None, error
+                surface_arguments = (fingerprint_kind, surface_path, output_directory, color, diagnostic_outputs, cache_directory, property_settings)
+                profile_filename = os.path.join(output_directory, profile_filename_prefix + name + ".txt") if profile_surface in (surface_file, name) else None
+                if instrumentation is not None or profile_filename:
+                        return surface_file, key, _submit_surface(executor, _fingerprint_surface_instrumented, surface_arguments + (blanket_bounds, content_digests, profile_filename)), None
+                return surface_file, key, _submit_surface(executor, fingerprint_surface, surface_arguments + (None, blanket_bounds, content_digests)), None
+
+        executor_context = concurrent.futures.ProcessPoolExecutor(max_workers=workers) if workers > 1 else contextlib.nullcontext()
+        with executor_context as executor:
+                pending_surfaces = collections.deque()
+                surface_iterator = iter(surface_files)
+                for surface_file in surface_iterator:
+                        pending_surfaces.append(start_surface(executor, surface_file))
+                        if len(pending_surfaces) >= workers * pending_surfaces_per_worker:
+                                break
+                while pending_surfaces:
+                        surface_file, key, surface_result, error = pending_surfaces.popleft()
+                        if isinstance(surface_result, concurrent.futures.Future):
+                                try:
+                                        surface_result = surface_result.result()
+                                        if isinstance(surface_result, tuple):
+                                                surface_result, worker_instrumentation = surface_result
+                                                merge_instrumentation(instrumentation, worker_instrumentation)
+                                        if key is not None:
+                                                put_cached_fingerprint(cache_directory, key, surface_result.split(",", 2)[2])
+                                except Exception as surface_error:
+                                        surface_result, error = None, surface_error
+                        yield surface_file, surface_result, error
+                        next_surface_file = next(surface_iterator, None)
+                        if next_surface_file is not None:
+                                pending_surfaces.append(start_surface(executor, next_surface_file))
+
+
+# Fingerprint every *.wrl surface in input_directory.  Returns the list of (surface_file, error message) failures.  With an instrumentation_filename the stage
+# times and counters of the run are saved to it (JSON, or the Prometheus textfile format for a *.prom name).  blanket_bounds is one of blanket_bounds_modes.
+def run_batch(fingerprint_kind, input_directory, output_directory, workers=None, colors_filename=None, diagnostic_outputs="none", fingerprint_format="csv", cache_directory=None, max_cache_size=default_cache_size,
+              instrumentation_filename=None, profile_surface=None, property_channels=default_property_channels, property_surface_suffixes=None, blanket_bounds="full"):
+        if fingerprint_kind not in fingerprints_filenames:
+                raise ValueError(f"Unknown fingerprint kind: {fingerprint_kind}")
+        if blanket_bounds not in blanket_bounds_modes:
+                raise ValueError(f"Unknown blanket bounds: {blanket_bounds}")
+        os.makedirs(output_directory, exist_ok=True)
+        property_settings = (tuple(property_channels), dict(property_surface_suffixes or {})) if fingerprint_kind == "db-properties" else None
+        surface_files = list_surface_files(input_directory, property_settings[1] if property_settings else None)
+        color_table = read_color_table(colors_filename) if colors_filename else {}
+        workers = workers or os.cpu_count() or 1
+        fingerprints_filename = os.path.join(output_directory, fingerprints_filenames[fingerprint_kind])
+        surface_failures = []
+        instrumentation = new_instrumentation(fingerprint_kind) if instrumentation_filename else None
+        if fingerprint_kind == "sb" and blanket_bounds == "library": #<----------------------------------- One window for the whole library, so that every fingerprint has the same layout
+                surface_reader = functools.partial(read_surface_cached, cache_directory, read_indexed_face_set) if cache_directory else read_indexed_face_set
+                with instrument_stage(instrumentation, "bounds", len(surface_files)):
+                        blanket_bounds = library_blanket_window([os.path.join(input_directory, surface_file) for surface_file in surface_files], surface_reader) or "mesh"
+
+        if fingerprint_format == "npz": #<------------------------------------------------------- Sparse binary archive (see relief_fingerprint_format.py), encoded row by row
+                fingerprints_filename = os.path.splitext(fingerprints_filename)[0] + ".npz"
+                archive_names, archive_colors, encoded_fingerprints, vocabulary = [], [], [], {}
+        file_object = open(fingerprints_filename, 'w') if fingerprint_format == "csv" else None
+        try:
+                if file_object:
+                        file_object.write("Name" + "," + "Color" + "," + "Fingerprints" + "," + "\n")
+                for surface_count, (surface_file, fingerprint_row, error) in enumerate(fingerprint_surfaces(fingerprint_kind, input_directory, output_directory, surface_files, color_table, workers, diagnostic_outputs, cache_directory,
+                                                                                                           instrumentation, profile_surface, property_settings, blanket_bounds), start=1):
+                        if error is not None:
+                                surface_failures.append((surface_file, f"{type(error).__name__}: {error}"))
+                                add_counter(instrumentation, "surfaces_failed")
+                                print(f"[{surface_count}/{len(surface_files)}] FAILED {surface_file}: {type(error).__name__}: {error}")
+                                continue
+                        with instrument_stage(instrumentation, "write"):
+                                if file_object:
+                                        file_object.write(fingerprint_row)
+                                        file_object.write("\n")
+                                else:
+                                        name, color, fingerprint_string = fingerprint_row.split(",", 2)
+                                        archive_names.append(name)
+                                        archive_colors.append(color)
+                                        encoded_fingerprints.append(encode_fingerprint(fingerprint_string, vocabulary, placeholder_tokens[fingerprint_kind]))
+                        print(f"[{surface_count}/{len(surface_files)}] {surface_file}")
+        finally:
+                if file_object:
+                        file_object.close()
+        if fingerprint_format == "npz":
+                with instrument_stage(instrumentation, "write"):
+                        save_fingerprint_archive(fingerprints_filename, archive_names, archive_colors, encoded_fingerprints, vocabulary, placeholder_tokens[fingerprint_kind])
+
+        if cache_directory is not None:
+                evict_cache(cache_directory, max_cache_size)
+
+        with open(os.path.join(output_directory, failures_filename), 'w', newline="") as file_object:
+                failures_writer = csv.writer(file_object)
+                failures_writer.writerow(["Name", "Error"])
+                failures_writer.writerows(surface_failures)
+        if instrumentation is not None:
+                write_instrumentation(instrumentation, instrumentation_filename)
+        return surface_failures
+
+
+def main(argv=None):
+        parser = argparse.ArgumentParser(description="Create ReLiEF fingerprints for every *.wrl surface in a directory.")
+        parser.add_argument("fingerprint_kind", choices=sorted(fingerprints_filenames), help="sb: segmentation-based, db: color distribution, db-distance: color and pair-distance distribution, db-properties: the --properties channels")
+        parser.add_argument("input_directory", help="Directory with the *.wrl surface files")
+        parser.add_argument("output_directory", help="Directory for the fingerprints file, the failures file and the sb-ReLiEF diagnostic files")
+        parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU core)")
+        parser.add_argument("--colors", default=None, help="CSV file with Name and Color columns used for the Color column of the fingerprints file")
+        parser.add_argument("--diagnostics", choices=diagnostic_output_modes, default="none", help="sb-ReLiEF diagnostic files: none (default), text (*.xyz and *.csv) or binary (*.npz)")
+        parser.add_argument("--format", choices=("csv", "npz"), default="csv", help="Fingerprints file format: csv (default) or the sparse npz archive of relief_fingerprint_format.py")
+        parser.add_argument("--cache", default=None, help="Cache directory for parsed surfaces and fingerprints.  Unchanged surfaces are not fingerprinted again.")
+        parser.add_argument("--cache-size", default="10G", help="Size limit of the cache directory, for example 500M or 10G (default: 10G).  Least recently used entries are removed first.")
+        parser.add_argument("--instrumentation", default=None, help="Save the stage times and counters of the run to this file: JSON, or the Prometheus textfile format for a *.prom name")
+        parser.add_argument("--profile", default=None, help="Run this surface (file name with or without .wrl) under the sampling profiler; the collapsed stacks go to ReLieF_Profile_<name>.txt")
+        parser.add_argument("--properties", default=",".join(default_property_channels), help="db-properties: comma-separated property channels, in fingerprint order (default: PC,DS)")
+        parser.add_argument("--property-surface", action="append", default=[], metavar="CODE=SUFFIX", help="db-properties: read channel CODE from <name>SUFFIX.wrl (repeatable)")
+        parser.add_argument("--blanket-bounds", choices=blanket_bounds_modes, default="full", help="sb: sweep the full blanket (default), the window of each surface (mesh) or one window holding every surface (library)")
+        arguments = parser.parse_args(argv)
+        property_surface_suffixes = dict(property_surface.split("=", 1) for property_surface in arguments.property_surface)
+        surface_failures = run_batch(arguments.fingerprint_kind, arguments.input_directory, arguments.output_directory, arguments.workers, arguments.colors, arguments.diagnostics, arguments.format,
+                                     arguments.cache, parse_cache_size(arguments.cache_size), arguments.instrumentation, arguments.profile,
+                                     arguments.properties.split(","), property_surface_suffixes, arguments.blanket_bounds)
+        print(f"Finished with {len(surface_failures)} failed surface(s)")
+        return 1 if surface_failures else 0
+
+
+if __name__ == "__main__":
+        sys.exit(main())
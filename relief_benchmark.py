@@ -0,0 +1,225 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Benchmarks of the three fingerprint pipelines on synthetic inputs (see relief_synthetic_inputs.py), at several input sizes.
+#
+#   python relief_benchmark.py run --output benchmark_results.json
+#   python relief_benchmark.py run --pipelines sb db --preset small --repeats 5 --output quick.json
+#   python relief_benchmark.py compare benchmark_before.json benchmark_after.json
+#
+# Every (pipeline, size) case runs in a fresh process, so its peak RSS is not inflated by the cases before it.  Each stage is timed repeats times and the
+# fastest run is kept; one more run under tracemalloc records the peak Python/numpy allocation of the stage.  The stages are
+#   sb:  parse (read_indexed_face_set), slice (slice_surface), index (build_segment_column_index), fingerprint (generate_sb_fingerprint on the parsed mesh),
+#        fingerprint_mesh_window (the same with blanket_bounds="mesh")
+#   db:  parse (read_dot_surface), color_bins (rgb_bin_counts), distance_bins (pairwise_distance_bin_counts), fingerprint (ColorAndDistance fingerprint
+#        on the parsed dots)
+#   pca: read_frames (iterate_trajectory_frames), pocket_columns (frame_pocket_columns of every frame), pca (fit_streaming_pca and the projection)
+# The results file is JSON with the git commit, library versions and machine of the run, so files written on different commits can be compared.
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import relief_synthetic_inputs
+
+benchmark_presets = {"small": {"sb": [2000, 8000], "db": [1000, 4000], "pca": [10, 40]},
+                     "default": {"sb": [2000, 8000, 32000], "db": [1000, 4000, 16000], "pca": [10, 40, 160]},
+                     "large": {"sb": [8000, 32000, 128000], "db": [4000, 16000, 64000], "pca": [40, 160, 640]}}
+benchmark_size_names = {"sb": "triangles", "db": "dots", "pca": "frames"}
+benchmark_repeats = 3
+benchmark_result_version = 1
+
+
+def _git_commit():
+        try:
+                return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+                return None
+
+
+def _library_versions():
+        versions = {"python": platform.python_version(), "numpy": np.__version__}
+        for library_name in ("scipy", "mdtraj"):
+                try:
+                        versions[library_name] = __import__(library_name).__version__
+                except ImportError:
+                        versions[library_name] = None
+        return versions
+
+
+# Peak resident set size of this process in bytes (ru_maxrss is in kilobytes on Linux and in bytes on macOS).
+def peak_rss_bytes():
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+# Run stage_function(*stage_arguments) repeats times plus once under tracemalloc.  Returns (stage result, {"seconds", "peak_traced_bytes"}).
+def time_stage(stage_function, *stage_arguments, repeats=benchmark_repeats):
+        stage_seconds = []
+        for repeat_index in range(repeats):
+                start_time = time.perf_counter()
+                stage_result = stage_function(*stage_arguments)
+                stage_seconds.append(time.perf_counter() - start_time)
+        tracemalloc.start()
+        try:
+                stage_function(*stage_arguments)
+                peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+                tracemalloc.stop()
+        return stage_result, {"seconds": min(stage_seconds), "peak_traced_bytes": peak_traced_bytes}
+
+
+def _benchmark_sb(work_directory, triangle_count, repeats):
+        from relief_vrml_parser import read_indexed_face_set, vertex_trio_array
+        from sb_relief_engine import sb_fingerprint_parameters, slice_surface, build_segment_column_index, generate_sb_fingerprint
+        wrl_filename = os.path.join(work_directory, f"synthetic_sb_{triangle_count}.wrl")
+        relief_synthetic_inputs.write_mesh_wrl(wrl_filename, relief_synthetic_inputs.mesh_triangles("sphere", triangle_count))
+        stages = {}
+        parsed_surface, stages["parse"] = time_stage(read_indexed_face_set, wrl_filename, repeats=repeats)
+        vertex_trio = vertex_trio_array(parsed_surface[0])
+        main_x_start, main_x_end = sb_fingerprint_parameters["main_x_start"], sb_fingerprint_parameters["main_x_end"]
+        total_blanket_rows = sb_fingerprint_parameters["total_blanket_rows"]
+        blanket_rows = [main_x_start + (main_x_end - main_x_start) * blanket_row_index / total_blanket_rows for blanket_row_index in range(0, total_blanket_rows)]
+        intersect_points, stages["slice"] = time_stage(slice_surface, vertex_trio, blanket_rows, [1, 0, 0], repeats=repeats)
+        segment_column_index, stages["index"] = time_stage(build_segment_column_index, intersect_points.tolist(), main_x_start, main_x_end, sb_fingerprint_parameters["y_axis_start"],
+                                                           sb_fingerprint_parameters["y_axis_end"], sb_fingerprint_parameters["y_axis_increment"] / 2, repeats=repeats)
+        fingerprint, stages["fingerprint"] = time_stage(generate_sb_fingerprint, wrl_filename, work_directory, "FILL_ME", "sampler", False, "none", lambda surface_file: parsed_surface, repeats=repeats)
+        windowed_fingerprint, stages["fingerprint_mesh_window"] = time_stage(generate_sb_fingerprint, wrl_filename, work_directory, "FILL_ME", "sampler", False, "none", lambda surface_file: parsed_surface,
+                                                                             None, "mesh", repeats=repeats)
+        return stages, {"triangles": len(vertex_trio), "intersect_points": len(intersect_points), "indexed_columns": len(segment_column_index),
+                        "set_bits": sum(fingerprint_token != "#" for fingerprint_token in fingerprint.split(" ")[1:]),
+                        "fingerprint_tokens": len(fingerprint.split(" ")) - 1, "mesh_window_tokens": len(windowed_fingerprint.split(" ")) - 1}
+
+
+def _benchmark_db(work_directory, dot_count, repeats):
+        from relief_vrml_parser import read_dot_surface
+        from db_relief_engine import rgb_bin_counts, pairwise_distance_bin_counts, generate_db_color_distance_fingerprint
+        wrl_filename = os.path.join(work_directory, f"synthetic_db_{dot_count}.wrl")
+        relief_synthetic_inputs.write_dot_wrl(wrl_filename, *relief_synthetic_inputs.dot_sphere(dot_count, "palette"))
+        stages = {}
+        (dot_coordinates, dot_colors), stages["parse"] = time_stage(read_dot_surface, wrl_filename, repeats=repeats)
+        color_counts, stages["color_bins"] = time_stage(rgb_bin_counts, dot_colors, repeats=repeats)
+        distance_counts, stages["distance_bins"] = time_stage(pairwise_distance_bin_counts, dot_coordinates, repeats=repeats)
+        fingerprint, stages["fingerprint"] = time_stage(generate_db_color_distance_fingerprint, wrl_filename, "exact", None, None, lambda surface_file: (dot_coordinates, dot_colors), repeats=repeats)
+        return stages, {"dots": len(dot_coordinates), "distance_pairs": int(np.sum(distance_counts)), "occupied_color_bins": int(np.count_nonzero(color_counts)),
+                        "matched_bins": fingerprint[1]}
+
+
+def _benchmark_pca(work_directory, frame_count, repeats):
+        import mdtraj as md
+        from trajectory_relief_engine import iterate_trajectory_frames, platform_slice_coordinates, pocket_contact_mask, frame_pocket_columns
+        from trajectory_relief_engine import frame_rows_to_csr, fit_streaming_pca, project_frame_chunk
+        trajectory_files = relief_synthetic_inputs.write_synthetic_trajectory(os.path.join(work_directory, f"synthetic_trajectory_{frame_count}"), frame_count)
+        slice_coordinates = platform_slice_coordinates(np.round((md.load(trajectory_files["grid"]).xyz[0] * 10.0).astype(np.float64), 3))
+        contact_mask = pocket_contact_mask(slice_coordinates, np.round((md.load(trajectory_files["pocket"]).xyz[0] * 10.0).astype(np.float64), 3))
+        stages = {}
+        trajectory_frames, stages["read_frames"] = time_stage(lambda: list(iterate_trajectory_frames(trajectory_files["trajectory"], trajectory_files["topology"])), repeats=repeats)
+        frame_columns, stages["pocket_columns"] = time_stage(lambda: [frame_pocket_columns(protein_coordinates, slice_coordinates, contact_mask) for frame, protein_coordinates in trajectory_frames],
+                                                             repeats=repeats)
+        frame_indices = list(range(len(frame_columns)))
+        frame_matrix = frame_rows_to_csr(frame_indices, [frame for frame in frame_indices for column in frame_columns[frame]], sum(frame_columns, []),
+                                         [1] * sum(len(column) for column in frame_columns))
+        projection, stages["pca"] = time_stage(lambda: project_frame_chunk(fit_streaming_pca(lambda: iter([frame_matrix])), frame_matrix), repeats=repeats)
+        return stages, {"frames": len(trajectory_frames), "protein_atoms": int(trajectory_frames[0][1].shape[0]), "set_bits": int(frame_matrix.nnz)}
+
+
+benchmark_pipelines = {"sb": _benchmark_sb, "db": _benchmark_db, "pca": _benchmark_pca}
+
+
+# One benchmark case.  Runs in its own process (see run_benchmarks).
+def run_benchmark_case(pipeline, input_size, work_directory, repeats=benchmark_repeats):
+        case_start_time = time.perf_counter()
+        stages, counts = benchmark_pipelines[pipeline](work_directory, input_size, repeats)
+        return {"pipeline": pipeline, "size_name": benchmark_size_names[pipeline], "size": input_size, "stages": stages, "counts": counts,
+                "case_seconds": time.perf_counter() - case_start_time, "peak_rss_bytes": peak_rss_bytes()}
+
+
+def run_benchmarks(pipeline_sizes, repeats=benchmark_repeats, work_directory=None, verbose=True):
+        results = {"result_version": benchmark_result_version, "git_commit": _git_commit(), "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                   "machine": {"platform": platform.platform(), "processor": platform.processor(), "cpu_count": os.cpu_count()}, "versions": _library_versions(),
+                   "repeats": repeats, "cases": []}
+        with tempfile.TemporaryDirectory(dir=work_directory) as case_directory:
+                for pipeline, input_sizes in pipeline_sizes.items():
+                        for input_size in input_sizes:
+                                with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor: #<------- Fresh process per case
+                                        case_result = executor.submit(run_benchmark_case, pipeline, input_size, case_directory, repeats).result()
+                                results["cases"].append(case_result)
+                                if verbose:
+                                        print(format_case(case_result))
+        return results
+
+
+def format_case(case_result):
+        stage_text = ", ".join(f"{stage_name} {stage['seconds']:.4f} s" for stage_name, stage in case_result["stages"].items())
+        return f"{case_result['pipeline']} {case_result['size']} {case_result['size_name']}: {stage_text}, peak RSS {case_result['peak_rss_bytes'] / 2 ** 20:.1f} MiB"
+
+
+# Rows of (pipeline, size, stage, old seconds, new seconds, new / old) for the cases and stages that appear in both result files.
+def compare_benchmarks(old_results, new_results):
+        old_stages = {(case["pipeline"], case["size"], stage_name): stage["seconds"] for case in old_results["cases"] for stage_name, stage in case["stages"].items()}
+        comparison_rows = []
+        for case in new_results["cases"]:
+                for stage_name, stage in case["stages"].items():
+                        old_seconds = old_stages.get((case["pipeline"], case["size"], stage_name))
+                        if old_seconds is not None:
+                                comparison_rows.append((case["pipeline"], case["size"], stage_name, old_seconds, stage["seconds"], stage["seconds"] / old_seconds if old_seconds > 0 else float("inf")))
+        return comparison_rows
+
+
+def main(argv=None):
+        parser = argparse.ArgumentParser(description="Benchmark the ReLiEF fingerprint pipelines on synthetic inputs.")
+        subparsers = parser.add_subparsers(dest="command", required=True)
+        run_parser = subparsers.add_parser("run", help="Run the benchmarks and write a JSON results file")
+        run_parser.add_argument("--pipelines", nargs="+", choices=sorted(benchmark_pipelines), default=["sb", "db", "pca"])
+        run_parser.add_argument("--preset", choices=sorted(benchmark_presets), default="default", help="Input sizes of every pipeline")
+        run_parser.add_argument("--sizes", type=int, nargs="+", default=None, help="Input sizes instead of the preset (triangles, dots or frames)")
+        run_parser.add_argument("--repeats", type=int, default=benchmark_repeats)
+        run_parser.add_argument("--work-directory", default=None, help="Where the synthetic inputs are written (default: the system temporary directory)")
+        run_parser.add_argument("--output", default="benchmark_results.json")
+        compare_parser = subparsers.add_parser("compare", help="Compare the stage times of two results files")
+        compare_parser.add_argument("old_results")
+        compare_parser.add_argument("new_results")
+        arguments = parser.parse_args(argv)
+
+        if arguments.command == "compare":
+                with open(arguments.old_results) as old_file, open(arguments.new_results) as new_file:
+                        old_results, new_results = json.load(old_file), json.load(new_file)
+                print(f"old: {old_results.get('git_commit')}  new: {new_results.get('git_commit')}")
+                for pipeline, input_size, stage_name, old_seconds, new_seconds, time_ratio in compare_benchmarks(old_results, new_results):
+                        print(f"{pipeline:>4} {input_size:>8} {stage_name:<16} {old_seconds:10.4f} s {new_seconds:10.4f} s  x{time_ratio:.3f}")
+                return 0
+
+        pipeline_sizes = {pipeline: arguments.sizes or benchmark_presets[arguments.preset][pipeline] for pipeline in arguments.pipelines}
+        results = run_benchmarks(pipeline_sizes, arguments.repeats, arguments.work_directory)
+        with open(arguments.output, "w") as output_file:
+                json.dump(results, output_file, indent=1)
+        return 0
+
+
+if __name__ == "__main__":
+        raise SystemExit(main())
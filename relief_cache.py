@@ -0,0 +1,183 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Persistent, content-addressed cache for parsed surfaces and fingerprints.
+#
+# Every entry is one file in the cache directory, named by a SHA-256 key:
+#   <key>.fingerprint.z   zlib-compressed fingerprint string (the part after "name,color,"), key = hash of the *.wrl content + fingerprint kind + parameters
+#   <key>.surface.npz     arrays returned by a relief_vrml_parser reader,                       key = hash of the *.wrl content + reader name
+# The file name and the Color column are not part of the key, so renamed or re-colored surfaces are still cache hits.  Entries are written to a temporary
+# file and renamed into place, so several worker processes can share one cache directory.  Reading an entry updates its modification time, and
+# evict_cache() removes the least recently used entries until the directory fits in the size limit.  Temporary files are left alone until they are
+# stale_temporary_file_age seconds old, since a younger one may still be filled by another process.
+#
+# The generator scripts and relief_batch_runner.py use the same entries: cached_fingerprint() looks a surface up and fingerprints it on a miss, and the batch
+# runner splits this between the main process (lookup) and its workers (fingerprinting), handing the content digests of the key to the workers.
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+file_read_size = 1024 * 1024
+default_cache_size = 10 * 1024 ** 3 #<---------------------------------------------------------------- 10 GB
+cache_entry_suffixes = (".fingerprint.z", ".surface.npz")
+stale_temporary_file_age = 24 * 60 * 60 #<------------------------------------------------------------ Seconds after which a *.tmp file is taken to be left over from a crashed writer
+
+
+# SHA-256 of a file's content.
+def file_content_digest(filename):
+        content_hash = hashlib.sha256()
+        with open(filename, "rb") as file_object:
+                for file_block in iter(lambda: file_object.read(file_read_size), b""):
+                        content_hash.update(file_block)
+        return content_hash.hexdigest()
+
+
+# Cache key of a surface content digest and a JSON-serializable description of what is computed from it (kind, parameters, reader name, ...).
+def cache_key(content_digest, key_parameters):
+        return hashlib.sha256((content_digest + json.dumps(key_parameters, sort_keys=True)).encode("utf-8")).hexdigest()
+
+
+def _entry_filename(cache_directory, key, suffix):
+        return os.path.join(cache_directory, key + suffix)
+
+
+def _touch_entry(entry_filename):
+        try:
+                os.utime(entry_filename)
+        except OSError:
+                pass
+
+
+def _write_entry(cache_directory, key, suffix, write_function):
+        os.makedirs(cache_directory, exist_ok=True)
+        file_descriptor, temporary_filename = tempfile.mkstemp(dir=cache_directory, suffix=".tmp")
+        try:
+                with os.fdopen(file_descriptor, "wb") as file_object:
+                        write_function(file_object)
+                os.replace(temporary_filename, _entry_filename(cache_directory, key, suffix))
+        except BaseException:
+                if os.path.exists(temporary_filename):
+                        os.remove(temporary_filename)
+                raise
+
+
+# Cached fingerprint string, or None on a miss.
+def get_cached_fingerprint(cache_directory, key):
+        entry_filename = _entry_filename(cache_directory, key, ".fingerprint.z")
+        try:
+                with open(entry_filename, "rb") as file_object:
+                        fingerprint_string = zlib.decompress(file_object.read()).decode("utf-8")
+        except (OSError, zlib.error):
+                return None
+        _touch_entry(entry_filename)
+        return fingerprint_string
+
+
+def put_cached_fingerprint(cache_directory, key, fingerprint_string):
+        _write_entry(cache_directory, key, ".fingerprint.z", lambda file_object: file_object.write(zlib.compress(fingerprint_string.encode("utf-8"), 6)))
+
+
+# Parse surface_file with surface_reader (for example relief_vrml_parser.read_dot_surface), or load the arrays cached for the same file content.
+# content_digest can be passed when it is already known.  Use functools.partial(read_surface_cached, cache_directory, surface_reader) as the surface_reader of
+# the generate_*_fingerprint() functions.
+def read_surface_cached(cache_directory, surface_reader, surface_file, content_digest=None):
+        key = cache_key(content_digest or file_content_digest(surface_file), {"surface_reader": surface_reader.__module__ + "." + surface_reader.__name__})
+        entry_filename = _entry_filename(cache_directory, key, ".surface.npz")
+        try:
+                with np.load(entry_filename, allow_pickle=False) as archive_file:
+                        surface_arrays = tuple(archive_file[f"array_{array_index}"] for array_index in range(len(archive_file.files)))
+                _touch_entry(entry_filename)
+                return surface_arrays
+        except (OSError, ValueError, KeyError):
+                pass
+        surface_arrays = surface_reader(surface_file)
+        _write_entry(cache_directory, key, ".surface.npz", lambda file_object: np.savez(file_object, **{f"array_{array_index}": surface_array for array_index, surface_array in enumerate(surface_arrays)}))
+        return surface_arrays
+
+
+# read_surface_cached() with the content digests that are already known, as a dict surface_file -> digest (files that are not listed are hashed).  Use
+# functools.partial(read_surface_cached_with_digests, cache_directory, surface_reader, content_digests) as the surface_reader.
+def read_surface_cached_with_digests(cache_directory, surface_reader, content_digests, surface_file):
+        return read_surface_cached(cache_directory, surface_reader, surface_file, content_digests.get(surface_file))
+
+
+# Content digests of the files a fingerprint is read from (the surface, then any property surfaces), as a dict surface_file -> digest, and the content digest
+# of the fingerprint key (the digests joined in that order).
+def surface_content_digests(surface_files):
+        content_digests = {surface_file: file_content_digest(surface_file) for surface_file in surface_files}
+        return content_digests, "".join(content_digests[surface_file] for surface_file in surface_files)
+
+
+# Fingerprint string (the part after "name,color,") of the surface_files, from the cache, or made by fingerprint_function(surface_reader) and added to the
+# cache.  key_parameters is everything else the fingerprint depends on.  The surface_reader handed to fingerprint_function caches the parsed surfaces with the
+# digests of the key, so every file is hashed once.  On a cache hit, hit_function(surface_reader) is called instead, if given, for the statistics that need the
+# surface (for example its number of dots); it reads the parsed surface from the cache.  Returns (fingerprint_string, cache_hit).
+def cached_fingerprint(cache_directory, surface_files, key_parameters, surface_reader, fingerprint_function, hit_function=None):
+        content_digests, content_digest = surface_content_digests(surface_files)
+        key = cache_key(content_digest, key_parameters)
+        surface_reader = functools.partial(read_surface_cached_with_digests, cache_directory, surface_reader, content_digests)
+        fingerprint_string = get_cached_fingerprint(cache_directory, key)
+        if fingerprint_string is not None:
+                if hit_function is not None:
+                        hit_function(surface_reader)
+                return fingerprint_string, True
+        fingerprint_string = fingerprint_function(surface_reader)
+        put_cached_fingerprint(cache_directory, key, fingerprint_string)
+        return fingerprint_string, False
+
+
+# Remove the least recently used entries (and stale temporary files) until the cache holds at most max_cache_size bytes.  Returns the number of bytes removed.
+# Temporary files younger than stale_temporary_file_age are neither counted nor removed: another process may still be writing them.
+def evict_cache(cache_directory, max_cache_size=default_cache_size):
+        if not os.path.isdir(cache_directory):
+                return 0
+        stale_time = time.time() - stale_temporary_file_age
+        cache_entries = []
+        for directory_entry in os.scandir(cache_directory):
+                if not directory_entry.is_file():
+                        continue
+                if directory_entry.name.endswith(cache_entry_suffixes) or directory_entry.name.endswith(".tmp"):
+                        entry_status = directory_entry.stat()
+                        if directory_entry.name.endswith(".tmp") and entry_status.st_mtime > stale_time:
+                                continue
+                        cache_entries.append((entry_status.st_mtime, entry_status.st_size, directory_entry.path))
+        cache_size = sum(entry_size for entry_time, entry_size, entry_path in cache_entries)
+        removed_size = 0
+        for entry_time, entry_size, entry_path in sorted(cache_entries):
+                if cache_size - removed_size <= max_cache_size:
+                        break
+                try:
+                        os.remove(entry_path)
+                        removed_size += entry_size
+                except OSError:
+                        pass
+        return removed_size
+
+
+# "500M", "10G", "2048" -> bytes.
+def parse_cache_size(cache_size_text):
+        size_units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+        cache_size_text = cache_size_text.strip().upper().rstrip("B")
+        if cache_size_text and cache_size_text[-1] in size_units:
+                return int(float(cache_size_text[:-1]) * size_units[cache_size_text[-1]])
+        return int(cache_size_text)
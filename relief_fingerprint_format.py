@@ -0,0 +1,149 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Compact sparse on-disk format for ReLiEF fingerprints (sb-ReLiEF and db-ReLiEF).
+#
+# A fingerprint string is the list of its space-separated tokens (str.split(" "), as in the TMAP notebooks).  Every distinct token gets an integer id in a
+# token dictionary (vocabulary), and one token, the placeholder, is not stored at all: "#" for sb-ReLiEF (empty map cells) and "%" for db-ReLiEF (bin
+# buffers).  Each fingerprint is stored as the sorted positions of its other tokens and their token ids, in CSR layout:
+#   row_indptr[i]:row_indptr[i + 1]   slice of token_positions / token_ids that belongs to fingerprint i
+#   row_lengths[i]                    number of tokens of fingerprint i (the positions that are not listed hold the placeholder)
+# together with the names, colors, token dictionary, placeholder_token_id and the CSV layout (header, line terminator and final newline) in one compressed
+# NumPy archive (*.npz).  No pickled objects are used, so archives load with allow_pickle=False.
+#
+#   python relief_fingerprint_format.py to-npz ReLieF_Fingerprints.csv ReLieF_Fingerprints.npz
+#   python relief_fingerprint_format.py to-csv ReLieF_Fingerprints.npz ReLieF_Fingerprints.csv
+#
+# to-csv writes back the exact bytes of the original CSV file.
+import collections
+import sys
+
+import numpy as np
+
+default_header = "Name" + "," + "Color" + "," + "Fingerprints" + ","
+placeholder_tokens = {"sb": "#", "db": "%", "db-distance": "%", "db-properties": "%"}
+
+
+# Encode one fingerprint string.  vocabulary is a dict token -> token id that grows as new tokens are seen.  Returns (row_length, token_positions, token_ids).
+def encode_fingerprint(fingerprint_string, vocabulary, placeholder_token):
+        fingerprint_tokens = fingerprint_string.split(" ")
+        token_positions = [token_position for token_position, fingerprint_token in enumerate(fingerprint_tokens) if fingerprint_token != placeholder_token]
+        token_ids = [vocabulary.setdefault(fingerprint_tokens[token_position], len(vocabulary)) for token_position in token_positions]
+        return len(fingerprint_tokens), token_positions, token_ids
+
+
+# Save encoded fingerprints.  encoded_fingerprints is a list of encode_fingerprint() results in the same order as names and colors.
+def save_fingerprint_archive(npz_filename, names, colors, encoded_fingerprints, vocabulary, placeholder_token, header=default_header, line_terminator="\n", final_newline=True):
+        vocabulary = dict(vocabulary)
+        placeholder_token_id = vocabulary.setdefault(placeholder_token, len(vocabulary))
+        vocabulary_tokens = [""] * len(vocabulary)
+        for fingerprint_token, token_id in vocabulary.items():
+                vocabulary_tokens[token_id] = fingerprint_token
+        row_lengths = np.array([row_length for row_length, token_positions, token_ids in encoded_fingerprints], dtype=np.int64)
+        row_indptr = np.zeros(len(encoded_fingerprints) + 1, dtype=np.int64)
+        row_indptr[1:] = np.cumsum([len(token_positions) for row_length, token_positions, token_ids in encoded_fingerprints])
+        token_positions = np.fromiter((token_position for row_length, row_positions, row_ids in encoded_fingerprints for token_position in row_positions), dtype=np.int32, count=int(row_indptr[-1]))
+        token_ids = np.fromiter((token_id for row_length, row_positions, row_ids in encoded_fingerprints for token_id in row_ids), dtype=np.int32, count=int(row_indptr[-1]))
+        np.savez_compressed(npz_filename,
+                            names=np.array(names, dtype=str), colors=np.array(colors, dtype=str),
+                            vocabulary_utf8=np.frombuffer("\n".join(vocabulary_tokens).encode("utf-8"), dtype=np.uint8), placeholder_token_id=np.int64(placeholder_token_id),
+                            row_lengths=row_lengths, row_indptr=row_indptr, token_positions=token_positions, token_ids=token_ids,
+                            header=np.array(header), line_terminator=np.array(line_terminator), final_newline=np.bool_(final_newline))
+
+
+# Load an archive into a dict of arrays (the keys listed in save_fingerprint_archive()).  The token dictionary is stored as one newline-separated UTF-8 block
+# (fingerprint tokens never contain a newline) and is returned as the "vocabulary" array of token strings.
+def load_fingerprint_archive(npz_filename):
+        with np.load(npz_filename, allow_pickle=False) as archive_file:
+                fingerprint_archive = {archive_key: archive_file[archive_key] for archive_key in archive_file.files}
+        fingerprint_archive["vocabulary"] = np.array(fingerprint_archive.pop("vocabulary_utf8").tobytes().decode("utf-8").split("\n"), dtype=object)
+        return fingerprint_archive
+
+
+# Token ids of every position of fingerprint i, placeholders included.
+def fingerprint_token_id_row(fingerprint_archive, fingerprint_index):
+        row_start, row_end = fingerprint_archive["row_indptr"][fingerprint_index:fingerprint_index + 2]
+        token_id_row = np.full(int(fingerprint_archive["row_lengths"][fingerprint_index]), int(fingerprint_archive["placeholder_token_id"]), dtype=np.int32)
+        token_id_row[fingerprint_archive["token_positions"][row_start:row_end]] = fingerprint_archive["token_ids"][row_start:row_end]
+        return token_id_row
+
+
+# Drop-in replacement for [fingerprint.split(" ") for fingerprint in df['Fingerprints']] in the TMAP notebooks.
+def fingerprint_token_lists(fingerprint_archive):
+        vocabulary_tokens = fingerprint_archive["vocabulary"]
+        return [vocabulary_tokens[fingerprint_token_id_row(fingerprint_archive, fingerprint_index)].tolist() for fingerprint_index in range(len(fingerprint_archive["names"]))]
+
+
+# The fingerprint strings, as written by the generators.
+def fingerprint_strings(fingerprint_archive):
+        return [" ".join(fingerprint_tokens) for fingerprint_tokens in fingerprint_token_lists(fingerprint_archive)]
+
+
+# Sorted distinct token ids of every fingerprint (the token set that MinHash sees), straight from the CSR arrays without building any strings.  These can be
+# passed to tmap.Minhash.batch_from_sparse_binary_array() instead of the token strings.
+def fingerprint_feature_ids(fingerprint_archive):
+        fingerprint_features = []
+        row_indptr = fingerprint_archive["row_indptr"]
+        placeholder_token_id = int(fingerprint_archive["placeholder_token_id"])
+        for fingerprint_index in range(len(fingerprint_archive["names"])):
+                row_token_ids = fingerprint_archive["token_ids"][row_indptr[fingerprint_index]:row_indptr[fingerprint_index + 1]]
+                if row_indptr[fingerprint_index + 1] - row_indptr[fingerprint_index] < fingerprint_archive["row_lengths"][fingerprint_index]: #<------ Some positions hold the placeholder
+                        row_token_ids = np.append(row_token_ids, placeholder_token_id)
+                fingerprint_features.append(np.unique(row_token_ids).astype(np.uint32))
+        return fingerprint_features
+
+
+# Convert a fingerprints CSV file (Name,Color,Fingerprints) into an archive.  Without placeholder_token the most frequent token of the first rows is used.
+def convert_csv_to_archive(csv_filename, npz_filename, placeholder_token=None):
+        with open(csv_filename, newline="") as file_object:
+                csv_text = file_object.read()
+        final_newline = csv_text.endswith("\n")
+        csv_lines = csv_text.split("\n")
+        if final_newline:
+                csv_lines.pop()
+        line_terminator = "\r\n" if csv_lines and csv_lines[0].endswith("\r") else "\n"
+        if line_terminator == "\r\n":
+                csv_lines = [csv_line[:-1] if csv_line.endswith("\r") else csv_line for csv_line in csv_lines]
+        header = csv_lines[0] if csv_lines else default_header
+        csv_rows = [csv_line.split(",", 2) for csv_line in csv_lines[1:]]
+        if placeholder_token is None:
+                token_counts = collections.Counter(fingerprint_token for csv_row in csv_rows[:100] for fingerprint_token in csv_row[2].split(" "))
+                placeholder_token = token_counts.most_common(1)[0][0] if token_counts else "#"
+        vocabulary = {}
+        encoded_fingerprints = [encode_fingerprint(csv_row[2], vocabulary, placeholder_token) for csv_row in csv_rows]
+        save_fingerprint_archive(npz_filename, [csv_row[0] for csv_row in csv_rows], [csv_row[1] for csv_row in csv_rows], encoded_fingerprints, vocabulary, placeholder_token,
+                                 header, line_terminator, final_newline)
+
+
+# Write an archive back as a fingerprints CSV file.
+def write_archive_csv(fingerprint_archive, csv_filename):
+        line_terminator = str(fingerprint_archive["line_terminator"])
+        csv_lines = [str(fingerprint_archive["header"])]
+        csv_lines += [name + "," + color + "," + fingerprint_string for name, color, fingerprint_string in zip(fingerprint_archive["names"].tolist(), fingerprint_archive["colors"].tolist(), fingerprint_strings(fingerprint_archive))]
+        with open(csv_filename, 'w', newline="") as file_object:
+                file_object.write(line_terminator.join(csv_lines))
+                if bool(fingerprint_archive["final_newline"]):
+                        file_object.write(line_terminator)
+
+
+if __name__ == "__main__":
+        if len(sys.argv) != 4 or sys.argv[1] not in ("to-npz", "to-csv"):
+                sys.exit("usage: python relief_fingerprint_format.py to-npz|to-csv INPUT_FILE OUTPUT_FILE")
+        if sys.argv[1] == "to-npz":
+                convert_csv_to_archive(sys.argv[2], sys.argv[3])
+        else:
+                write_archive_csv(load_fingerprint_archive(sys.argv[2]), sys.argv[3])
@@ -0,0 +1,195 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Per-stage timing, counters and profiling for the fingerprint pipelines, in place of progress prints.
+#
+# An instrumentation record is a plain dict (see new_instrumentation()) that the engines fill in when it is passed as their instrumentation argument; with
+# instrumentation=None nothing is recorded.  Every named stage (parse, slice, sample, pair, bin, emit, write, ...) keeps its number of calls, wall time,
+# number of items and, when the record was created with track_memory=True, the peak traced memory of the stage (tracemalloc, above the memory in use when the
+# stage started).  Counters are summed (intersections, dots, set bits, ...) and maxima keep the largest value seen (longest_fingerprint_length, ...).
+# Records made in worker processes are combined with merge_instrumentation().
+#
+# write_instrumentation() saves a record as JSON, or in the Prometheus textfile format when the file name ends in ".prom" (for the node_exporter textfile
+# collector).  sampling_profiler() samples the Python stack of one run (for example a single surface file) and writes the collapsed stacks, one
+# "frame;frame;frame count" line per stack, which flamegraph.pl and speedscope read.
+import cProfile
+import collections
+import contextlib
+import json
+import os
+import re
+import signal
+import threading
+import time
+import tracemalloc
+
+profile_sampling_interval = 0.005 #<------------------------------------------------------------------- Seconds of CPU time between two stack samples
+prometheus_metric_prefix = "relief"
+
+
+def new_instrumentation(pipeline, track_memory=False):
+        return {"pipeline": pipeline, "track_memory": track_memory, "stages": {}, "counters": {}, "maxima": {}, "_memory_stack": []}
+
+
+def _stage_entry(instrumentation, stage_name):
+        return instrumentation["stages"].setdefault(stage_name, {"calls": 0, "seconds": 0.0, "items": 0, "peak_traced_bytes": None})
+
+
+# Add one run of a stage that was timed by the caller (for stages that run inside tight loops, where a context manager per call would cost too much).
+def record_stage(instrumentation, stage_name, seconds, items=0, calls=1, peak_traced_bytes=None):
+        if instrumentation is None:
+                return
+        stage = _stage_entry(instrumentation, stage_name)
+        stage["calls"] += calls
+        stage["seconds"] += seconds
+        stage["items"] += items
+        if peak_traced_bytes is not None:
+                stage["peak_traced_bytes"] = max(stage["peak_traced_bytes"] or 0, peak_traced_bytes)
+
+
+# Time the body of the with block as one run of stage_name.  Stages may be nested; the peak memory of a nested stage also counts towards the outer stage.
+@contextlib.contextmanager
+def instrument_stage(instrumentation, stage_name, items=0):
+        if instrumentation is None:
+                yield
+                return
+        memory_stack = instrumentation["_memory_stack"] if instrumentation["track_memory"] else None
+        if memory_stack is not None:
+                if not tracemalloc.is_tracing():
+                        tracemalloc.start()
+                        memory_stack.append(None) #<------------------------------------------------------ Marks that this stage started tracemalloc
+                elif memory_stack and memory_stack[-1] is not None:
+                        memory_stack[-1][1] = max(memory_stack[-1][1], tracemalloc.get_traced_memory()[1] - memory_stack[-1][0])
+                tracemalloc.reset_peak()
+                memory_stack.append([tracemalloc.get_traced_memory()[0], 0])
+        start_time = time.perf_counter()
+        try:
+                yield
+        finally:
+                seconds = time.perf_counter() - start_time
+                peak_traced_bytes = None
+                if memory_stack is not None:
+                        traced_peak = tracemalloc.get_traced_memory()[1]
+                        memory_base, nested_peak = memory_stack.pop()
+                        peak_traced_bytes = max(nested_peak, traced_peak - memory_base)
+                        if memory_stack and memory_stack[-1] is None:
+                                memory_stack.pop()
+                                tracemalloc.stop()
+                        elif memory_stack:
+                                memory_stack[-1][1] = max(memory_stack[-1][1], traced_peak - memory_stack[-1][0])
+                record_stage(instrumentation, stage_name, seconds, items, peak_traced_bytes=peak_traced_bytes)
+
+
+def add_counter(instrumentation, counter_name, value=1):
+        if instrumentation is not None:
+                instrumentation["counters"][counter_name] = instrumentation["counters"].get(counter_name, 0) + value
+
+
+def update_maximum(instrumentation, maximum_name, value):
+        if instrumentation is not None:
+                instrumentation["maxima"][maximum_name] = max(instrumentation["maxima"].get(maximum_name, value), value)
+
+
+# Add the stages, counters and maxima of source_instrumentation (for example a record returned by a worker process) to instrumentation.
+def merge_instrumentation(instrumentation, source_instrumentation):
+        if instrumentation is None or source_instrumentation is None:
+                return
+        for stage_name, stage in source_instrumentation["stages"].items():
+                record_stage(instrumentation, stage_name, stage["seconds"], stage["items"], stage["calls"], stage["peak_traced_bytes"])
+        for counter_name, value in source_instrumentation["counters"].items():
+                add_counter(instrumentation, counter_name, value)
+        for maximum_name, value in source_instrumentation["maxima"].items():
+                update_maximum(instrumentation, maximum_name, value)
+
+
+# JSON-ready copy of a record, without the bookkeeping entries.
+def instrumentation_summary(instrumentation):
+        return {record_key: record_value for record_key, record_value in instrumentation.items() if not record_key.startswith("_")}
+
+
+def _metric_name(name):
+        return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def prometheus_text(instrumentation, metric_prefix=prometheus_metric_prefix):
+        pipeline_label = f'pipeline="{instrumentation["pipeline"]}"'
+        metric_lines = []
+        for metric_suffix, stage_field, metric_type, metric_help in (("stage_seconds_total", "seconds", "counter", "Wall time spent in the stage"),
+                                                                      ("stage_calls_total", "calls", "counter", "Runs of the stage"),
+                                                                      ("stage_items_total", "items", "counter", "Items handled by the stage"),
+                                                                      ("stage_peak_traced_bytes", "peak_traced_bytes", "gauge", "Peak traced memory of the stage")):
+                stage_values = [(stage_name, stage[stage_field]) for stage_name, stage in sorted(instrumentation["stages"].items()) if stage[stage_field] is not None]
+                if not stage_values:
+                        continue
+                metric_lines += [f"# HELP {metric_prefix}_{metric_suffix} {metric_help}", f"# TYPE {metric_prefix}_{metric_suffix} {metric_type}"]
+                metric_lines += [f'{metric_prefix}_{metric_suffix}{{{pipeline_label},stage="{stage_name}"}} {stage_value}' for stage_name, stage_value in stage_values]
+        for record_key, metric_suffix, metric_type in (("counters", "_total", "counter"), ("maxima", "", "gauge")):
+                for metric_name, value in sorted(instrumentation[record_key].items()):
+                        metric_lines += [f"# TYPE {metric_prefix}_{_metric_name(metric_name)}{metric_suffix} {metric_type}", f"{metric_prefix}_{_metric_name(metric_name)}{metric_suffix}{{{pipeline_label}}} {value}"]
+        return "\n".join(metric_lines) + "\n"
+
+
+# Save a record as JSON, or as a Prometheus textfile when the file name ends in ".prom".  The file is replaced in one step, so a collector never reads half of it.
+def write_instrumentation(instrumentation, instrumentation_filename):
+        temporary_filename = instrumentation_filename + ".tmp"
+        with open(temporary_filename, 'w') as file_object:
+                if instrumentation_filename.endswith(".prom"):
+                        file_object.write(prometheus_text(instrumentation))
+                else:
+                        json.dump(instrumentation_summary(instrumentation), file_object, indent=1)
+        os.replace(temporary_filename, instrumentation_filename)
+
+
+# Sample the Python stack every interval seconds of CPU time (SIGPROF) while the with block runs and write the collapsed stacks to profile_filename.
+# Where SIGPROF is not available (Windows, or outside the main thread) the block is profiled with cProfile instead and the pstats file is written.
+@contextlib.contextmanager
+def sampling_profiler(profile_filename, interval=profile_sampling_interval):
+        if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                        yield
+                finally:
+                        profiler.disable()
+                        profiler.dump_stats(profile_filename)
+                return
+        stack_counts = collections.Counter()
+
+        def take_sample(signal_number, frame):
+                stack_frames = []
+                while frame is not None:
+                        stack_frames.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})")
+                        frame = frame.f_back
+                stack_counts[";".join(reversed(stack_frames))] += 1
+
+        previous_handler = signal.signal(signal.SIGPROF, take_sample)
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+        try:
+                yield
+        finally:
+                signal.setitimer(signal.ITIMER_PROF, 0, 0)
+                signal.signal(signal.SIGPROF, previous_handler)
+                with open(profile_filename, 'w') as file_object:
+                        file_object.write("".join(f"{stack} {sample_count}\n" for stack, sample_count in stack_counts.most_common()))
+
+
+# The profiler for surface_file when it is the selected profile_surface (file name with or without the extension), otherwise a context that does nothing.
+def surface_profiler(surface_file, profile_surface, profile_filename):
+        surface_name = os.path.basename(surface_file)
+        if profile_surface and profile_surface in (surface_name, os.path.splitext(surface_name)[0]):
+                return sampling_profiler(profile_filename)
+        return contextlib.nullcontext()
@@ -0,0 +1,229 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Exact all-vs-all Jaccard (Tanimoto) similarity of ReLiEF fingerprints.
+#
+# The token sets are the same as in relief_similarity_index.py (distinct tokens without the placeholders).  Every fingerprint is packed into a row of
+# 64-bit words with one bit per token of a feature vocabulary, which is the sorted list of all distinct tokens (new tokens are appended at the end, so the
+# columns of an existing vocabulary never move).  For two rows, |A & B| is the popcount of the AND of their words and |A | B| = |A| + |B| - |A & B|, so the
+# Jaccard similarity of sets and the Tanimoto coefficient of bit vectors are the same number.  Two empty fingerprints have similarity 0.
+#
+# The matrix is computed in square tiles of the upper triangle, shared out to one thread per CPU core.  The tile size follows from the memory budget, so
+# the working memory does not grow with the number of fingerprints.  The result is written as either
+#   *.npy   the full n x n float32 matrix, as a memory-mapped NumPy file (np.load(filename, mmap_mode="r"))
+#   *.npz   sparse neighbor list: arrays first, second (indices, first < second), similarity and names, for the pairs with similarity >= --threshold
+#   *.csv   the same neighbor list as Name1,Name2,Similarity rows
+#
+#   python relief_jaccard_matrix.py ReLieF_Fingerprints.csv similarity_matrix.npy
+#   python relief_jaccard_matrix.py ReLieF_Fingerprints.npz neighbors.npz --threshold 0.5 --memory-budget 2G
+#   python relief_jaccard_matrix.py new_fingerprints.csv new_neighbors.npz --vocabulary neighbors_vocabulary.txt
+#
+# The feature vocabulary is saved next to the output as <output name>_vocabulary.txt.  Passing an earlier vocabulary file with --vocabulary keeps its
+# columns and only appends the new tokens, so the feature ids stay the same between runs.
+import argparse
+import concurrent.futures
+import os
+import threading
+
+import numpy as np
+
+from relief_cache import parse_cache_size
+from relief_similarity_index import read_fingerprint_tokens, placeholder_feature_tokens
+
+default_memory_budget = 1024 ** 3 #<---------------------------------------------------------------- 1 GB of tile buffers
+minimum_tile_size = 64
+maximum_tile_size = 4096
+
+if hasattr(np, "bitwise_count"): #<--------------------------------------------------------------- NumPy >= 2.0
+        def _popcount(words):
+                return np.bitwise_count(words)
+else:
+        byte_popcounts = np.array([bin(byte_value).count("1") for byte_value in range(256)], dtype=np.uint8)
+
+        def _popcount(words):
+                return byte_popcounts[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+# Sorted feature vocabulary of tokenized fingerprints.  With an existing vocabulary, only the new tokens are added, at the end.
+def feature_vocabulary(fingerprint_token_rows, vocabulary_tokens=()):
+        vocabulary_tokens = list(vocabulary_tokens)
+        known_tokens = set(vocabulary_tokens)
+        new_tokens = {fingerprint_token for fingerprint_tokens in fingerprint_token_rows for fingerprint_token in fingerprint_tokens} - known_tokens - set(placeholder_feature_tokens)
+        return vocabulary_tokens + sorted(new_tokens)
+
+
+# Vocabulary files hold one token per line (fingerprint tokens never contain a newline).
+def read_feature_vocabulary(vocabulary_filename):
+        with open(vocabulary_filename, encoding="utf-8", newline="\n") as file_object:
+                return file_object.read().split("\n")[:-1]
+
+
+def write_feature_vocabulary(vocabulary_tokens, vocabulary_filename):
+        with open(vocabulary_filename, 'w', encoding="utf-8", newline="\n") as file_object:
+                file_object.write("".join(fingerprint_token + "\n" for fingerprint_token in vocabulary_tokens))
+
+
+# n x ceil(len(vocabulary) / 64) uint64 bit rows; column c is bit c & 63 of word c >> 6.  The bits are set straight into the words, so no array larger
+# than the packed rows is built.  Tokens that are not in the vocabulary are ignored.
+def pack_fingerprint_bits(fingerprint_token_rows, vocabulary_tokens):
+        token_columns = {fingerprint_token: column_index for column_index, fingerprint_token in enumerate(vocabulary_tokens)}
+        word_count = max(1, (len(vocabulary_tokens) + 63) // 64)
+        fingerprint_bits = np.zeros((len(fingerprint_token_rows), word_count), dtype=np.uint64)
+        for row_index, fingerprint_tokens in enumerate(fingerprint_token_rows):
+                column_indices = np.array([token_columns[fingerprint_token] for fingerprint_token in set(fingerprint_tokens) if fingerprint_token in token_columns], dtype=np.uint64)
+                np.bitwise_or.at(fingerprint_bits[row_index], (column_indices >> np.uint64(6)).astype(np.intp), np.left_shift(np.uint64(1), column_indices & np.uint64(63)))
+        return fingerprint_bits
+
+
+# Largest tile size whose buffers (one intersection-count tile, one AND tile and one similarity tile per thread) fit in memory_budget.
+def tile_size_for_budget(memory_budget, workers):
+        bytes_per_tile_cell = 4 + 8 + 8 + 4
+        tile_size = int((memory_budget / max(1, workers) / bytes_per_tile_cell) ** 0.5)
+        return min(maximum_tile_size, max(minimum_tile_size, tile_size))
+
+
+# Jaccard similarity tile of bit rows first_bits x second_bits (float32).
+def jaccard_tile(first_bits, second_bits, first_counts, second_counts):
+        intersection_counts = np.zeros((len(first_bits), len(second_bits)), dtype=np.uint32)
+        for word_index in range(first_bits.shape[1]): #<------------------------------------------------ One word at a time keeps the buffers at tile size
+                intersection_counts += _popcount(first_bits[:, word_index, None] & second_bits[None, :, word_index])
+        union_counts = first_counts[:, None] + second_counts[None, :] - intersection_counts
+        similarity_tile = np.zeros(intersection_counts.shape, dtype=np.float32)
+        np.divide(intersection_counts, union_counts, out=similarity_tile, where=union_counts > 0, casting="unsafe")
+        return similarity_tile
+
+
+# Compute all tiles of the upper triangle and hand each (first_start, second_start, similarity_tile) to tile_function, from the worker threads.
+def for_each_jaccard_tile(fingerprint_bits, tile_function, tile_size=None, workers=None, memory_budget=default_memory_budget):
+        workers = workers or os.cpu_count() or 1
+        tile_size = tile_size or tile_size_for_budget(memory_budget, workers)
+        fingerprint_counts = _popcount(fingerprint_bits).sum(axis=1, dtype=np.uint32)
+        tile_starts = range(0, len(fingerprint_bits), tile_size)
+
+        def run_tile(first_start, second_start):
+                tile_function(first_start, second_start, jaccard_tile(fingerprint_bits[first_start:first_start + tile_size], fingerprint_bits[second_start:second_start + tile_size],
+                                                                      fingerprint_counts[first_start:first_start + tile_size], fingerprint_counts[second_start:second_start + tile_size]))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                pending_tiles = set()
+                for first_start in tile_starts:
+                        for second_start in tile_starts[first_start // tile_size:]:
+                                pending_tiles.add(executor.submit(run_tile, first_start, second_start))
+                                if len(pending_tiles) >= 2 * workers: #<----------------------------------------- Bounded queue: finished tiles are released before new ones start
+                                        finished_tiles, pending_tiles = concurrent.futures.wait(pending_tiles, return_when=concurrent.futures.FIRST_COMPLETED)
+                                        for finished_tile in finished_tiles:
+                                                finished_tile.result()
+                for finished_tile in concurrent.futures.as_completed(pending_tiles):
+                        finished_tile.result()
+
+
+# Full similarity matrix written to a memory-mapped *.npy file.  Returns the memory-mapped array.
+def jaccard_matrix_to_npy(fingerprint_bits, npy_filename, tile_size=None, workers=None, memory_budget=default_memory_budget):
+        similarity_matrix = np.lib.format.open_memmap(npy_filename, mode="w+", dtype=np.float32, shape=(len(fingerprint_bits), len(fingerprint_bits)))
+
+        def write_tile(first_start, second_start, similarity_tile):
+                similarity_matrix[first_start:first_start + similarity_tile.shape[0], second_start:second_start + similarity_tile.shape[1]] = similarity_tile
+                similarity_matrix[second_start:second_start + similarity_tile.shape[1], first_start:first_start + similarity_tile.shape[0]] = similarity_tile.T
+
+        for_each_jaccard_tile(fingerprint_bits, write_tile, tile_size, workers, memory_budget)
+        similarity_matrix.flush()
+        return similarity_matrix
+
+
+# Pairs (first < second) with similarity >= threshold.  Returns (first, second, similarity) arrays sorted by first, then second.
+def jaccard_neighbor_list(fingerprint_bits, threshold, tile_size=None, workers=None, memory_budget=default_memory_budget):
+        neighbor_tiles = []
+        neighbor_tiles_lock = threading.Lock()
+
+        def collect_tile(first_start, second_start, similarity_tile):
+                tile_first, tile_second = np.nonzero(similarity_tile >= threshold)
+                tile_first = tile_first + first_start
+                tile_second = tile_second + second_start
+                upper_pairs = tile_first < tile_second
+                with neighbor_tiles_lock:
+                        neighbor_tiles.append((tile_first[upper_pairs], tile_second[upper_pairs], similarity_tile[tile_first[upper_pairs] - first_start, tile_second[upper_pairs] - second_start]))
+
+        for_each_jaccard_tile(fingerprint_bits, collect_tile, tile_size, workers, memory_budget)
+        if not neighbor_tiles:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        first_indices, second_indices, similarities = (np.concatenate(neighbor_arrays) for neighbor_arrays in zip(*neighbor_tiles))
+        pair_order = np.lexsort((second_indices, first_indices))
+        return first_indices[pair_order].astype(np.int64), second_indices[pair_order].astype(np.int64), similarities[pair_order]
+
+
+# Jaccard similarities computed from Python sets, to check the bit-packed kernel.
+def jaccard_matrix_reference(fingerprint_token_rows):
+        token_sets = [set(fingerprint_tokens) - set(placeholder_feature_tokens) for fingerprint_tokens in fingerprint_token_rows]
+        similarity_matrix = np.zeros((len(token_sets), len(token_sets)), dtype=np.float64)
+        for first_index, first_set in enumerate(token_sets):
+                for second_index, second_set in enumerate(token_sets):
+                        union_size = len(first_set | second_set)
+                        similarity_matrix[first_index, second_index] = len(first_set & second_set) / union_size if union_size else 0.0
+        return similarity_matrix
+
+
+# The kernel must give the same matrix as the set reference (up to float32 rounding), also with tiles smaller than the input.
+def check_jaccard_equivalence(fingerprint_token_rows, tile_size=minimum_tile_size):
+        fingerprint_bits = pack_fingerprint_bits(fingerprint_token_rows, feature_vocabulary(fingerprint_token_rows))
+        similarity_matrix = np.zeros((len(fingerprint_token_rows), len(fingerprint_token_rows)), dtype=np.float32)
+
+        def write_tile(first_start, second_start, similarity_tile):
+                similarity_matrix[first_start:first_start + similarity_tile.shape[0], second_start:second_start + similarity_tile.shape[1]] = similarity_tile
+                similarity_matrix[second_start:second_start + similarity_tile.shape[1], first_start:first_start + similarity_tile.shape[0]] = similarity_tile.T
+
+        for_each_jaccard_tile(fingerprint_bits, write_tile, tile_size)
+        maximum_difference = float(np.abs(similarity_matrix - jaccard_matrix_reference(fingerprint_token_rows)).max(initial=0.0))
+        print(f"Jaccard kernel vs. set reference: {len(fingerprint_token_rows)} fingerprints, maximum difference {maximum_difference:.2e}")
+        return maximum_difference < 1e-6
+
+
+def main(argv=None):
+        parser = argparse.ArgumentParser(description="Exact all-vs-all Jaccard (Tanimoto) similarity of ReLiEF fingerprints.")
+        parser.add_argument("fingerprints_filename", help="Fingerprint CSV file or *.npz archive (relief_fingerprint_format.py)")
+        parser.add_argument("output_filename", nargs="?", help="*.npy for the memory-mapped matrix, *.npz or *.csv for the thresholded neighbor list")
+        parser.add_argument("--threshold", type=float, default=0.5, help="Smallest similarity kept in a neighbor list (default: 0.5)")
+        parser.add_argument("--memory-budget", default="1G", help="Memory for the tile buffers, for example 512M or 4G (default: 1G)")
+        parser.add_argument("--workers", type=int, default=None, help="Threads (default: one per CPU core)")
+        parser.add_argument("--vocabulary", default=None, help="Vocabulary file of an earlier run; its tokens keep their columns and new tokens are appended")
+        parser.add_argument("--check", action="store_true", help="Compare the kernel with a Python set computation on the first 200 fingerprints")
+        arguments = parser.parse_args(argv)
+        names, fingerprint_token_rows = read_fingerprint_tokens(arguments.fingerprints_filename)
+        if arguments.check:
+                return 0 if check_jaccard_equivalence(fingerprint_token_rows[:200]) else 1
+        if arguments.output_filename is None:
+                parser.error("an output file is needed")
+        vocabulary_tokens = feature_vocabulary(fingerprint_token_rows, read_feature_vocabulary(arguments.vocabulary) if arguments.vocabulary else ())
+        write_feature_vocabulary(vocabulary_tokens, os.path.splitext(arguments.output_filename)[0] + "_vocabulary.txt")
+        fingerprint_bits = pack_fingerprint_bits(fingerprint_token_rows, vocabulary_tokens)
+        memory_budget = parse_cache_size(arguments.memory_budget)
+        if arguments.output_filename.endswith(".npy"):
+                jaccard_matrix_to_npy(fingerprint_bits, arguments.output_filename, workers=arguments.workers, memory_budget=memory_budget)
+                return 0
+        first_indices, second_indices, similarities = jaccard_neighbor_list(fingerprint_bits, arguments.threshold, workers=arguments.workers, memory_budget=memory_budget)
+        if arguments.output_filename.endswith(".npz"):
+                np.savez_compressed(arguments.output_filename, first=first_indices, second=second_indices, similarity=similarities, names=np.array(names, dtype=str))
+        else:
+                with open(arguments.output_filename, 'w') as file_object:
+                        file_object.write("Name1,Name2,Similarity\n")
+                        for first_index, second_index, similarity in zip(first_indices.tolist(), second_indices.tolist(), similarities.tolist()):
+                                file_object.write(f"{names[first_index]},{names[second_index]},{similarity:.6f}\n")
+        print(f"{len(similarities)} pairs with similarity >= {arguments.threshold}")
+        return 0
+
+
+if __name__ == "__main__":
+        raise SystemExit(main())
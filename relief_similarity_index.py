@@ -0,0 +1,374 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# MinHash / LSH similarity search over ReLiEF fingerprints, with a persistent on-disk index.
+#
+# Features.  A fingerprint is reduced to the set of its tokens (as in the TMAP notebooks), without the placeholder tokens ("#", "%" and the empty token), and
+# every token is mapped to a stable 32-bit feature id with CRC-32, so fingerprints from different files and runs share the same feature ids.  For the
+# weighted variant the instance suffix is removed ("PC&#ffa000&7" -> "PC&#ffa000") and the number of instances becomes the feature weight, which is the
+# count of dots (db-ReLiEF) or of map cells (sb-ReLiEF) behind the feature.  The blanket window token of windowed sb-ReLiEF fingerprints ("@x...", see
+# sb_relief_engine.py) only records where the map rows sit on the blanket and is dropped when the fingerprints are read.
+#
+# Signatures.  MinHash uses num_perm multiply-shift hash functions and estimates the Jaccard similarity of the token sets.  Weighted MinHash uses Ioffe's
+# improved consistent weighted sampling (ICWS) and estimates the weighted (min/max) Jaccard similarity of the feature counts.  Both estimates are the
+# fraction of equal signature entries.  Empty fingerprints (no features) have no signature to compare: they are not indexed, get no neighbors as queries and
+# score 0 against everything.
+#
+# Index.  The signatures are cut into bands of rows_per_band entries; two fingerprints become candidates when they agree on a whole band.  An index is a
+# directory with index.json and one sub-directory per insert ("segment") holding names.npy, signatures.npy and, per band, the sorted band keys and the
+# fingerprint ids that go with them.  The arrays are memory-mapped when the index is loaded, so queries only touch the pages they need.
+#
+#   python relief_similarity_index.py build INDEX_DIRECTORY ReLieF_Fingerprints.csv [--weighted] [--num-perm 128] [--bands 32]
+#   python relief_similarity_index.py add   INDEX_DIRECTORY new_fingerprints.npz
+#   python relief_similarity_index.py query INDEX_DIRECTORY query_fingerprints.csv --k 10
+#
+# Fingerprint files can be fingerprint CSV files or archives of relief_fingerprint_format.py.
+import argparse
+import concurrent.futures
+import json
+import os
+import re
+import shutil
+import zlib
+
+import numpy as np
+
+from relief_fingerprint_format import load_fingerprint_archive, fingerprint_token_lists
+
+placeholder_feature_tokens = ("#", "%", "")
+window_token_prefix = "@x"
+instance_suffix_pattern = re.compile(r"&\d+$")
+default_num_perm = 128
+default_bands = 32
+default_seed = 1
+signature_block_rows = 4096 #<--------------------------------------------------------------- Fingerprints per signature block.  Blocks are shared out to one thread per CPU core.
+index_metadata_filename = "index.json"
+empty_signature_value = np.iinfo(np.uint32).max
+
+splitmix_increment = np.uint64(0x9E3779B97F4A7C15)
+splitmix_first_multiplier = np.uint64(0xBF58476D1CE4E5B9)
+splitmix_second_multiplier = np.uint64(0x94D049BB133111EB)
+
+
+############################################################################################### Features
+
+def token_feature_id(fingerprint_token):
+        return zlib.crc32(fingerprint_token.encode("utf-8"))
+
+
+# Sorted distinct feature ids (uint32) of one tokenized fingerprint.
+def fingerprint_features(fingerprint_tokens):
+        return np.unique(np.array([token_feature_id(fingerprint_token) for fingerprint_token in set(fingerprint_tokens) if fingerprint_token not in placeholder_feature_tokens], dtype=np.uint32))
+
+
+# (feature ids, weights) of one tokenized fingerprint.  The weight of a feature is the number of tokens that share it once the "&<instance>" suffix is removed.
+def weighted_fingerprint_features(fingerprint_tokens):
+        feature_counts = {}
+        for fingerprint_token in fingerprint_tokens:
+                if fingerprint_token not in placeholder_feature_tokens:
+                        feature_token = instance_suffix_pattern.sub("", fingerprint_token)
+                        feature_counts[feature_token] = feature_counts.get(feature_token, 0) + 1
+        feature_ids = np.array([token_feature_id(feature_token) for feature_token in feature_counts], dtype=np.uint32)
+        feature_weights = np.array(list(feature_counts.values()), dtype=np.float64)
+        feature_order = np.argsort(feature_ids, kind="stable")
+        return feature_ids[feature_order], feature_weights[feature_order]
+
+
+# Token list of a fingerprint without its blanket window token, if it has one (it directly follows the leading empty token).
+def _without_window_token(fingerprint_tokens):
+        if len(fingerprint_tokens) > 1 and fingerprint_tokens[1].startswith(window_token_prefix):
+                del fingerprint_tokens[1]
+        return fingerprint_tokens
+
+
+# (names, token lists) of a fingerprint CSV file or a relief_fingerprint_format.py archive.
+def read_fingerprint_tokens(fingerprints_filename):
+        if fingerprints_filename.endswith(".npz"):
+                fingerprint_archive = load_fingerprint_archive(fingerprints_filename)
+                return fingerprint_archive["names"].tolist(), [_without_window_token(fingerprint_tokens) for fingerprint_tokens in fingerprint_token_lists(fingerprint_archive)]
+        names = []
+        fingerprint_token_rows = []
+        with open(fingerprints_filename, newline="") as file_object:
+                next(file_object, None) #<--------------------------------------------------------------- Header row
+                for csv_line in file_object:
+                        csv_line = csv_line.rstrip("\r\n")
+                        if csv_line:
+                                name, color, fingerprint_string = csv_line.split(",", 2)
+                                names.append(name)
+                                fingerprint_token_rows.append(_without_window_token(fingerprint_string.split(" ")))
+        return names, fingerprint_token_rows
+
+
+############################################################################################### Signatures
+
+def _splitmix64(hash_values):
+        hash_values = hash_values + splitmix_increment
+        hash_values = (hash_values ^ (hash_values >> np.uint64(30))) * splitmix_first_multiplier
+        hash_values = (hash_values ^ (hash_values >> np.uint64(27))) * splitmix_second_multiplier
+        return hash_values ^ (hash_values >> np.uint64(31))
+
+
+def _hash_parameters(num_perm, seed):
+        random_generator = np.random.default_rng(seed)
+        hash_multipliers = random_generator.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1) #<------ Odd multipliers
+        hash_offsets = random_generator.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        return hash_multipliers, hash_offsets
+
+
+# Uniform (0, 1) values that only depend on (feature id, permutation, salt, seed), for the consistent weighted sampling.
+def _feature_uniforms(feature_ids, num_perm, salt, seed):
+        hash_inputs = (feature_ids.astype(np.uint64)[:, None] << np.uint64(32)) | (np.arange(num_perm, dtype=np.uint64)[None, :] * np.uint64(8) + np.uint64(salt))
+        hash_values = _splitmix64(hash_inputs ^ _splitmix64(np.array([seed], dtype=np.uint64)))
+        return ((hash_values >> np.uint64(11)).astype(np.float64) + 0.5) * (2.0 ** -53)
+
+
+def _minhash_block(feature_sets, hash_multipliers, hash_offsets):
+        block_signatures = np.full((len(feature_sets), len(hash_multipliers)), empty_signature_value, dtype=np.uint32)
+        feature_counts = np.array([len(feature_ids) for feature_ids in feature_sets], dtype=np.int64)
+        filled_rows = np.flatnonzero(feature_counts)
+        if len(filled_rows) == 0:
+                return block_signatures
+        block_features = np.concatenate([feature_sets[row_index] for row_index in filled_rows.tolist()]).astype(np.uint64)
+        hashed_features = ((block_features[:, None] * hash_multipliers[None, :] + hash_offsets[None, :]) >> np.uint64(32)).astype(np.uint32)
+        row_starts = np.concatenate(([0], np.cumsum(feature_counts[filled_rows])[:-1]))
+        block_signatures[filled_rows] = np.minimum.reduceat(hashed_features, row_starts, axis=0)
+        return block_signatures
+
+
+def _weighted_minhash_block(weighted_feature_sets, num_perm, seed):
+        block_signatures = np.full((len(weighted_feature_sets), num_perm), empty_signature_value, dtype=np.uint32)
+        for row_index, (feature_ids, feature_weights) in enumerate(weighted_feature_sets):
+                positive_weights = feature_weights > 0
+                feature_ids = feature_ids[positive_weights]
+                if len(feature_ids) == 0:
+                        continue
+                log_weights = np.log(feature_weights[positive_weights])[:, None]
+                gamma_r = -np.log(_feature_uniforms(feature_ids, num_perm, 0, seed) * _feature_uniforms(feature_ids, num_perm, 1, seed)) #<------- Gamma(2, 1) samples
+                gamma_c = -np.log(_feature_uniforms(feature_ids, num_perm, 2, seed) * _feature_uniforms(feature_ids, num_perm, 3, seed))
+                beta = _feature_uniforms(feature_ids, num_perm, 4, seed)
+                sample_t = np.floor(log_weights / gamma_r + beta)
+                log_a = np.log(gamma_c) - gamma_r * (sample_t - beta) - gamma_r
+                selected_features = np.argmin(log_a, axis=0)
+                selected_t = sample_t[selected_features, np.arange(num_perm)].astype(np.int64).astype(np.uint64)
+                block_signatures[row_index] = (_splitmix64((feature_ids[selected_features].astype(np.uint64) << np.uint64(32)) ^ selected_t) >> np.uint64(32)).astype(np.uint32)
+        return block_signatures
+
+
+# MinHash signatures (n x num_perm, uint32) of a list of feature id arrays, or, with weighted=True, ICWS signatures of a list of (feature ids, weights).
+# Empty fingerprints get all-0xFFFFFFFF signatures.  Blocks of fingerprints run on a thread pool (workers=None uses one thread per CPU core).
+def fingerprint_signatures(feature_sets, num_perm=default_num_perm, seed=default_seed, weighted=False, workers=None):
+        hash_multipliers, hash_offsets = _hash_parameters(num_perm, seed)
+        feature_blocks = [feature_sets[block_start:block_start + signature_block_rows] for block_start in range(0, len(feature_sets), signature_block_rows)]
+        if weighted:
+                block_function = lambda feature_block: _weighted_minhash_block(feature_block, num_perm, seed)
+        else:
+                block_function = lambda feature_block: _minhash_block(feature_block, hash_multipliers, hash_offsets)
+        if not feature_blocks:
+                return np.empty((0, num_perm), dtype=np.uint32)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+                return np.concatenate(list(executor.map(block_function, feature_blocks)))
+
+
+# Signatures of tokenized fingerprints, with the feature extraction that matches the index settings.
+def token_list_signatures(fingerprint_token_rows, num_perm=default_num_perm, seed=default_seed, weighted=False, workers=None):
+        feature_function = weighted_fingerprint_features if weighted else fingerprint_features
+        return fingerprint_signatures([feature_function(fingerprint_tokens) for fingerprint_tokens in fingerprint_token_rows], num_perm, seed, weighted, workers)
+
+
+# Rows of signatures that belong to empty fingerprints.
+def empty_signature_rows(signatures):
+        return (np.atleast_2d(np.asarray(signatures)) == empty_signature_value).all(axis=1)
+
+
+# Estimated (weighted) Jaccard similarity of one signature against many.  Empty fingerprints score 0, also against each other.
+def signature_similarity(query_signature, signatures):
+        signatures = np.asarray(signatures)
+        similarities = (signatures == query_signature[None, :]).mean(axis=1)
+        if empty_signature_rows(query_signature).any():
+                return np.zeros_like(similarities)
+        similarities[empty_signature_rows(signatures)] = 0.0 #<------------------------------------- Indexes built before empty fingerprints were skipped may still hold them
+        return similarities
+
+
+############################################################################################### LSH index
+
+def band_keys(signatures, bands):
+        signatures = np.asarray(signatures)
+        rows_per_band = signatures.shape[1] // bands
+        band_hashes = np.zeros((len(signatures), bands), dtype=np.uint64)
+        for band_row in range(rows_per_band):
+                band_hashes = _splitmix64(band_hashes ^ signatures[:, band_row::rows_per_band][:, :bands].astype(np.uint64))
+        return band_hashes
+
+
+def _write_segment(segment_directory, names, signatures, bands):
+        os.makedirs(segment_directory)
+        segment_band_keys = band_keys(signatures, bands).T #<--------------------------------------- bands x fingerprints
+        band_order = np.argsort(segment_band_keys, axis=1, kind="stable")
+        np.save(os.path.join(segment_directory, "names.npy"), np.array(names, dtype=str))
+        np.save(os.path.join(segment_directory, "signatures.npy"), np.ascontiguousarray(signatures, dtype=np.uint32))
+        np.save(os.path.join(segment_directory, "band_keys.npy"), np.take_along_axis(segment_band_keys, band_order, axis=1))
+        np.save(os.path.join(segment_directory, "band_ids.npy"), band_order.astype(np.int64))
+
+
+def _write_metadata(index_directory, index_metadata):
+        temporary_filename = os.path.join(index_directory, index_metadata_filename + ".tmp")
+        with open(temporary_filename, "w") as file_object:
+                json.dump(index_metadata, file_object, indent=1)
+        os.replace(temporary_filename, os.path.join(index_directory, index_metadata_filename))
+
+
+# Create an empty index directory.  num_perm must be a multiple of bands.
+def create_similarity_index(index_directory, num_perm=default_num_perm, bands=default_bands, weighted=False, seed=default_seed):
+        if num_perm % bands:
+                raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        os.makedirs(index_directory, exist_ok=True)
+        if os.path.exists(os.path.join(index_directory, index_metadata_filename)):
+                raise FileExistsError(f"There is already a similarity index in {index_directory}")
+        _write_metadata(index_directory, {"num_perm": num_perm, "bands": bands, "weighted": weighted, "seed": seed, "feature_hash": "crc32", "segments": [], "fingerprint_count": 0})
+
+
+def read_index_metadata(index_directory):
+        with open(os.path.join(index_directory, index_metadata_filename)) as file_object:
+                return json.load(file_object)
+
+
+# Add fingerprints to an index as a new segment.  Empty fingerprints are skipped.  Returns the number of fingerprints in the index.
+def add_to_similarity_index(index_directory, names, fingerprint_token_rows, workers=None):
+        index_metadata = read_index_metadata(index_directory)
+        signatures = token_list_signatures(fingerprint_token_rows, index_metadata["num_perm"], index_metadata["seed"], index_metadata["weighted"], workers)
+        return add_signatures_to_similarity_index(index_directory, names, signatures)
+
+
+def add_signatures_to_similarity_index(index_directory, names, signatures):
+        index_metadata = read_index_metadata(index_directory)
+        indexed_rows = ~empty_signature_rows(signatures) if len(names) else np.zeros(0, dtype=bool)
+        names = [name for name, indexed_row in zip(names, indexed_rows.tolist()) if indexed_row]
+        signatures = np.asarray(signatures)[indexed_rows]
+        if len(names) == 0:
+                return index_metadata["fingerprint_count"]
+        segment_name = f"segment_{len(index_metadata['segments']):06d}"
+        while os.path.exists(os.path.join(index_directory, segment_name)):
+                segment_name += "_"
+        _write_segment(os.path.join(index_directory, segment_name), names, signatures, index_metadata["bands"])
+        index_metadata["segments"].append(segment_name)
+        index_metadata["fingerprint_count"] += len(names)
+        _write_metadata(index_directory, index_metadata)
+        return index_metadata["fingerprint_count"]
+
+
+# Merge all segments into one (fewer segments make queries faster after many small inserts).
+def compact_similarity_index(index_directory):
+        similarity_index = load_similarity_index(index_directory)
+        if len(similarity_index["segments"]) <= 1:
+                return
+        names = np.concatenate([index_segment["names"] for index_segment in similarity_index["segments"]])
+        signatures = np.concatenate([index_segment["signatures"] for index_segment in similarity_index["segments"]])
+        index_metadata = read_index_metadata(index_directory)
+        old_segments = index_metadata["segments"]
+        segment_name = "segment_compacted_" + str(len(old_segments))
+        _write_segment(os.path.join(index_directory, segment_name), names.tolist(), signatures, index_metadata["bands"])
+        index_metadata["segments"] = [segment_name]
+        _write_metadata(index_directory, index_metadata)
+        del similarity_index, names, signatures
+        for old_segment in old_segments:
+                shutil.rmtree(os.path.join(index_directory, old_segment), ignore_errors=True)
+
+
+# Load an index.  The segment arrays are memory-mapped.
+def load_similarity_index(index_directory):
+        similarity_index = read_index_metadata(index_directory)
+        similarity_index["segments"] = [{array_name: np.load(os.path.join(index_directory, segment_name, array_name + ".npy"), mmap_mode="r", allow_pickle=False)
+                                         for array_name in ("names", "signatures", "band_keys", "band_ids")}
+                                        for segment_name in similarity_index["segments"]]
+        return similarity_index
+
+
+# Top-k most similar indexed fingerprints for each query signature.  Returns one list per query of (name, estimated similarity), most similar first.
+# Empty query fingerprints get an empty list.
+# Only the LSH candidates (same key in at least one band) are scored, unless exhaustive=True, which scores every indexed fingerprint.
+def query_similarity_index(similarity_index, query_signatures, k=10, exhaustive=False):
+        query_signatures = np.atleast_2d(np.asarray(query_signatures, dtype=np.uint32))
+        query_band_keys = band_keys(query_signatures, similarity_index["bands"])
+        empty_queries = empty_signature_rows(query_signatures).tolist()
+        query_results = [[] for query_index in range(len(query_signatures))]
+        for index_segment in similarity_index["segments"]:
+                segment_size = len(index_segment["names"])
+                if not exhaustive:
+                        range_starts = np.empty(query_band_keys.shape, dtype=np.int64)
+                        range_ends = np.empty(query_band_keys.shape, dtype=np.int64)
+                        for band_index in range(similarity_index["bands"]):
+                                range_starts[:, band_index] = np.searchsorted(index_segment["band_keys"][band_index], query_band_keys[:, band_index], side="left")
+                                range_ends[:, band_index] = np.searchsorted(index_segment["band_keys"][band_index], query_band_keys[:, band_index], side="right")
+                for query_index, query_signature in enumerate(query_signatures):
+                        if empty_queries[query_index]:
+                                continue
+                        if exhaustive:
+                                candidate_ids = np.arange(segment_size)
+                        else:
+                                candidate_ids = np.unique(np.concatenate([index_segment["band_ids"][band_index, range_start:range_end]
+                                                                          for band_index, (range_start, range_end) in enumerate(zip(range_starts[query_index].tolist(), range_ends[query_index].tolist()))
+                                                                          if range_end > range_start] or [np.empty(0, dtype=np.int64)]))
+                        if len(candidate_ids) == 0:
+                                continue
+                        candidate_similarities = signature_similarity(query_signature, index_segment["signatures"][candidate_ids])
+                        if len(candidate_ids) > k:
+                                best_candidates = np.argpartition(-candidate_similarities, k - 1)[:k]
+                                candidate_ids, candidate_similarities = candidate_ids[best_candidates], candidate_similarities[best_candidates]
+                        query_results[query_index].extend(zip(index_segment["names"][candidate_ids].tolist(), candidate_similarities.tolist()))
+        return [sorted(query_result, key=lambda neighbor: (-neighbor[1], neighbor[0]))[:k] for query_result in query_results]
+
+
+# Top-k neighbors of tokenized fingerprints (signatures computed with the index settings).
+def query_fingerprint_tokens(similarity_index, fingerprint_token_rows, k=10, exhaustive=False, workers=None):
+        query_signatures = token_list_signatures(fingerprint_token_rows, similarity_index["num_perm"], similarity_index["seed"], similarity_index["weighted"], workers)
+        return query_similarity_index(similarity_index, query_signatures, k, exhaustive)
+
+
+def main(argv=None):
+        parser = argparse.ArgumentParser(description="MinHash/LSH similarity index over ReLiEF fingerprints.")
+        parser.add_argument("command", choices=("build", "add", "query", "compact"))
+        parser.add_argument("index_directory")
+        parser.add_argument("fingerprints_filename", nargs="?", help="Fingerprint CSV file or *.npz archive (relief_fingerprint_format.py)")
+        parser.add_argument("--weighted", action="store_true", help="build: weighted MinHash (ICWS) over instance counts")
+        parser.add_argument("--num-perm", type=int, default=default_num_perm, help="build: signature length")
+        parser.add_argument("--bands", type=int, default=default_bands, help="build: number of LSH bands (num_perm must be a multiple)")
+        parser.add_argument("--k", type=int, default=10, help="query: number of neighbors")
+        parser.add_argument("--exhaustive", action="store_true", help="query: score every indexed fingerprint instead of the LSH candidates")
+        parser.add_argument("--workers", type=int, default=None, help="Threads for computing signatures (default: one per CPU core)")
+        arguments = parser.parse_args(argv)
+        if arguments.command == "compact":
+                compact_similarity_index(arguments.index_directory)
+                return 0
+        if arguments.fingerprints_filename is None:
+                parser.error(f"{arguments.command} needs a fingerprints file")
+        names, fingerprint_token_rows = read_fingerprint_tokens(arguments.fingerprints_filename)
+        if arguments.command == "build":
+                create_similarity_index(arguments.index_directory, arguments.num_perm, arguments.bands, arguments.weighted)
+        if arguments.command in ("build", "add"):
+                fingerprint_count = add_to_similarity_index(arguments.index_directory, names, fingerprint_token_rows, arguments.workers)
+                print(f"The index holds {fingerprint_count} fingerprints")
+                return 0
+        print("Query,Neighbor,Similarity")
+        for name, query_result in zip(names, query_fingerprint_tokens(load_similarity_index(arguments.index_directory), fingerprint_token_rows, arguments.k, arguments.exhaustive, arguments.workers)):
+                for neighbor_name, neighbor_similarity in query_result:
+                        print(f"{name},{neighbor_name},{neighbor_similarity:.4f}")
+        return 0
+
+
+if __name__ == "__main__":
+        raise SystemExit(main())
@@ -0,0 +1,168 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Synthetic inputs for the three fingerprint pipelines, for benchmarks and quick checks without real surfaces or simulations.
+#
+#   sb:  triangulated VRML IndexedFaceSet meshes (sphere or torus) with about triangle_count triangles, written as consecutive vertex trios the way the
+#        sb-ReLiEF generator reads them.
+#   db:  VRML dot surfaces (one Transform per dot) with dot_count dots on a sphere and a chosen color distribution:
+#          uniform   every dot gets a random color
+#          palette   the dots share palette_size random colors
+#          gradient  red-white-blue blend over the surface, like an electrostatic potential coloring
+#   pca: a trajectory directory with top.pdb and traj.xtc (random protein-like atoms that move a little from frame to frame), grid.pdb (the 40 x 40 Ne
+#        platform at 0.5 Angstrom spacing) and pocket.pdb, in the layout that fingerprint_generator_for_PCA_analysis.py expects.
+#
+#   python relief_synthetic_inputs.py sb  OUTPUT_DIRECTORY --count 10 --size 20000 --shape torus
+#   python relief_synthetic_inputs.py db  OUTPUT_DIRECTORY --count 10 --size 5000 --colors palette
+#   python relief_synthetic_inputs.py pca OUTPUT_DIRECTORY --size 200
+import argparse
+import os
+
+import numpy as np
+
+mesh_shapes = ("sphere", "torus")
+dot_color_distributions = ("uniform", "palette", "gradient")
+platform_grid_size = 40
+platform_grid_spacing = 0.5
+platform_grid_height = 12.5
+
+
+def _triangle_grid_faces(row_count, column_count, wrap_rows):
+        faces = []
+        for row_index in range(row_count if wrap_rows else row_count - 1):
+                next_row_index = (row_index + 1) % row_count
+                for column_index in range(column_count):
+                        next_column_index = (column_index + 1) % column_count
+                        faces.append((row_index * column_count + column_index, next_row_index * column_count + column_index, next_row_index * column_count + next_column_index))
+                        faces.append((row_index * column_count + column_index, next_row_index * column_count + next_column_index, row_index * column_count + next_column_index))
+        return np.array(faces, dtype=np.int64)
+
+
+# (N, 3, 3) triangle vertices of a sphere (latitude / longitude mesh) or torus with about triangle_count triangles.
+def mesh_triangles(shape="sphere", triangle_count=10000, radius=12.0, center=(0.3, 0.2, 1.0), tube_radius=4.0):
+        if shape == "sphere":
+                longitude_count = max(3, int(round((triangle_count / 2) ** 0.5)))
+                latitude_count = max(3, int(round(triangle_count / (2 * longitude_count))) + 1)
+                polar_angles = np.linspace(0, np.pi, latitude_count)
+                azimuth_angles = np.linspace(0, 2 * np.pi, longitude_count, endpoint=False)
+                polar_grid, azimuth_grid = np.meshgrid(polar_angles, azimuth_angles, indexing="ij")
+                vertices = np.stack([radius * np.sin(polar_grid) * np.cos(azimuth_grid), radius * np.sin(polar_grid) * np.sin(azimuth_grid), radius * np.cos(polar_grid)], axis=-1).reshape(-1, 3)
+                faces = _triangle_grid_faces(latitude_count, longitude_count, wrap_rows=False)
+        elif shape == "torus":
+                tube_count = max(3, int(round((triangle_count / 2 * tube_radius / radius) ** 0.5)))
+                ring_count = max(3, int(round(triangle_count / (2 * tube_count))))
+                ring_grid, tube_grid = np.meshgrid(np.linspace(0, 2 * np.pi, ring_count, endpoint=False), np.linspace(0, 2 * np.pi, tube_count, endpoint=False), indexing="ij")
+                vertices = np.stack([(radius + tube_radius * np.cos(tube_grid)) * np.cos(ring_grid), (radius + tube_radius * np.cos(tube_grid)) * np.sin(ring_grid), tube_radius * np.sin(tube_grid)], axis=-1).reshape(-1, 3)
+                faces = _triangle_grid_faces(ring_count, tube_count, wrap_rows=True)
+        else:
+                raise ValueError(f"Unknown mesh shape: {shape}")
+        return vertices[faces] + np.asarray(center, dtype=np.float64)
+
+
+# Write an IndexedFaceSet *.wrl file: every triangle as three consecutive "x y z," points, then coordIndex.
+def write_mesh_wrl(wrl_filename, triangles):
+        vertex_lines = "".join(f"    {x_value:.4f} {y_value:.4f} {z_value:.4f},\n" for x_value, y_value, z_value in np.reshape(triangles, (-1, 3)).tolist())
+        coord_index = ", ".join(f"{3 * triangle_index}, {3 * triangle_index + 1}, {3 * triangle_index + 2}, -1" for triangle_index in range(len(triangles)))
+        with open(wrl_filename, 'w') as file_object:
+                file_object.write("#VRML V2.0 utf8\nShape {\n geometry IndexedFaceSet {\n  coord Coordinate {\n   point [\n")
+                file_object.write(vertex_lines)
+                file_object.write("   ]\n  }\n  coordIndex [\n" + coord_index + "\n  ]\n }\n}\n")
+
+
+# (dot_coordinates, dot_colors) of dot_count dots spread evenly over a sphere (Fibonacci lattice).
+def dot_sphere(dot_count=5000, color_distribution="uniform", radius=12.0, palette_size=12, seed=0):
+        random_generator = np.random.default_rng(seed)
+        dot_indices = np.arange(dot_count) + 0.5
+        polar_angles = np.arccos(1 - 2 * dot_indices / dot_count)
+        azimuth_angles = np.pi * (1 + 5 ** 0.5) * dot_indices
+        dot_coordinates = radius * np.stack([np.sin(polar_angles) * np.cos(azimuth_angles), np.sin(polar_angles) * np.sin(azimuth_angles), np.cos(polar_angles)], axis=1)
+        if color_distribution == "uniform":
+                dot_colors = random_generator.random((dot_count, 3))
+        elif color_distribution == "palette":
+                dot_colors = random_generator.random((palette_size, 3))[random_generator.integers(0, palette_size, dot_count)]
+        elif color_distribution == "gradient":
+                potential = np.sin(2 * polar_angles) * np.cos(azimuth_angles) #<----------------- Smooth value in [-1, 1] over the surface
+                dot_colors = np.where(potential[:, None] < 0, np.stack([np.ones(dot_count), 1 + potential, 1 + potential], axis=1), np.stack([1 - potential, 1 - potential, np.ones(dot_count)], axis=1))
+        else:
+                raise ValueError(f"Unknown color distribution: {color_distribution}")
+        return dot_coordinates, dot_colors
+
+
+# Write a dot surface *.wrl file (one Transform block per dot).
+def write_dot_wrl(wrl_filename, dot_coordinates, dot_colors):
+        with open(wrl_filename, 'w') as file_object:
+                file_object.write("#VRML V2.0 utf8\n")
+                file_object.write("".join(f"Transform {{\n translation {x_value:.6f} {y_value:.6f} {z_value:.6f}\n children Shape {{\n appearance Appearance {{ material Material {{ diffuseColor {red:.4f} {green:.4f} {blue:.4f}\n shininess 0.5 }} }} }} }}\n"
+                                          for (x_value, y_value, z_value), (red, green, blue) in zip(np.asarray(dot_coordinates).tolist(), np.asarray(dot_colors).tolist())))
+
+
+def _single_element_topology(atom_count, residue_name, element):
+        import mdtraj as md
+        topology = md.Topology()
+        chain = topology.add_chain()
+        for atom_index in range(atom_count):
+                topology.add_atom(element.symbol, element, topology.add_residue(residue_name, chain))
+        return topology
+
+
+# Write top.pdb, traj.xtc, grid.pdb and pocket.pdb into trajectory_directory.  Returns the file names as a dict.
+def write_synthetic_trajectory(trajectory_directory, frame_count=100, atom_count=2000, pocket_atom_count=80, seed=0):
+        import mdtraj as md
+        random_generator = np.random.default_rng(seed)
+        os.makedirs(trajectory_directory, exist_ok=True)
+        trajectory_files = {trajectory_part: os.path.join(trajectory_directory, trajectory_filename) for trajectory_part, trajectory_filename in
+                            (("topology", "top.pdb"), ("trajectory", "traj.xtc"), ("grid", "grid.pdb"), ("pocket", "pocket.pdb"))}
+        base_coordinates = random_generator.uniform([-10, -10, -14], [10, 10, 14], (atom_count, 3))
+        frame_coordinates = base_coordinates + np.cumsum(random_generator.normal(0, 0.1, (frame_count, atom_count, 3)), axis=0) #<------- Random walk around the start
+        protein_trajectory = md.Trajectory((frame_coordinates / 10.0).astype(np.float32), _single_element_topology(atom_count, "ALA", md.element.carbon)) #<------- mdtraj works in nm
+        protein_trajectory[0].save_pdb(trajectory_files["topology"])
+        protein_trajectory.save_xtc(trajectory_files["trajectory"])
+        grid_axis = (np.arange(platform_grid_size) - (platform_grid_size - 1) / 2) * platform_grid_spacing
+        grid_coordinates = np.array([[x_value, y_value, platform_grid_height] for x_value in grid_axis for y_value in grid_axis])
+        md.Trajectory((grid_coordinates / 10.0)[None].astype(np.float32), _single_element_topology(len(grid_coordinates), "NE", md.element.neon)).save_pdb(trajectory_files["grid"])
+        pocket_coordinates = random_generator.uniform([-8, -8, -12], [8, 8, 12], (pocket_atom_count, 3))
+        md.Trajectory((pocket_coordinates / 10.0)[None].astype(np.float32), _single_element_topology(pocket_atom_count, "POC", md.element.carbon)).save_pdb(trajectory_files["pocket"])
+        return trajectory_files
+
+
+def main(argv=None):
+        parser = argparse.ArgumentParser(description="Write synthetic inputs for the ReLiEF fingerprint pipelines.")
+        parser.add_argument("pipeline", choices=("sb", "db", "pca"))
+        parser.add_argument("output_directory")
+        parser.add_argument("--size", type=int, default=None, help="Triangles per mesh (sb, default 10000), dots per surface (db, default 5000) or frames (pca, default 100)")
+        parser.add_argument("--count", type=int, default=1, help="Number of files (sb, db)")
+        parser.add_argument("--shape", choices=mesh_shapes, default="sphere", help="sb mesh shape")
+        parser.add_argument("--colors", choices=dot_color_distributions, default="uniform", help="db color distribution")
+        parser.add_argument("--atoms", type=int, default=2000, help="pca protein atoms")
+        parser.add_argument("--seed", type=int, default=0)
+        arguments = parser.parse_args(argv)
+        os.makedirs(arguments.output_directory, exist_ok=True)
+        if arguments.pipeline == "pca":
+                write_synthetic_trajectory(arguments.output_directory, arguments.size or 100, arguments.atoms, seed=arguments.seed)
+                return 0
+        for file_index in range(arguments.count):
+                wrl_filename = os.path.join(arguments.output_directory, f"synthetic_{arguments.pipeline}_{file_index:04d}.wrl")
+                if arguments.pipeline == "sb":
+                        random_generator = np.random.default_rng(arguments.seed + file_index)
+                        write_mesh_wrl(wrl_filename, mesh_triangles(arguments.shape, arguments.size or 10000, radius=random_generator.uniform(8, 16), center=random_generator.uniform(-3, 3, 3)))
+                else:
+                        write_dot_wrl(wrl_filename, *dot_sphere(arguments.size or 5000, arguments.colors, seed=arguments.seed + file_index))
+        return 0
+
+
+if __name__ == "__main__":
+        raise SystemExit(main())
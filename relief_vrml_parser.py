@@ -0,0 +1,128 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Streaming VRML (*.wrl) parser shared by the sb-ReLiEF and db-ReLiEF generators.
+# The file is memory-mapped and scanned in line-aligned chunks with compiled byte regular expressions.  Values are collected into contiguous float64 arrays
+# instead of per-line Python lists.  The extraction rules are the same as the line-by-line re.search() loops that the generators used before:
+#   sb-ReLiEF: every line before the first "coordIndex" line that contains "x y z," contributes one vertex (first match on the line).
+#   db-ReLiEF: a "Transform" line opens a dot block and a "shininess" line closes it.  Inside a block the first "translation x y z" and
+#              "diffuseColor r g b" on each line are the dot center and dot color.
+import mmap
+import re
+
+import numpy as np
+
+chunk_size = 8 * 1024 * 1024 #<------------------------------------------------------------------------- Bytes per chunk.  Chunks are extended to the next newline so no line is split.
+
+vertex_line_pattern = re.compile(rb"^[^\n]*?(-?\d+\.\d+)[^\S\n]+(-?\d+\.\d+)[^\S\n]+(-?\d+\.\d+),", re.MULTILINE)
+coord_index_pattern = re.compile(rb"coordIndex[^\[]*\[([^\]]*)\]")
+translation_pattern = re.compile(rb"translation[^\S\n]+(-?\d+\.\d+)[^\S\n]+(-?\d+\.\d+)[^\S\n]+(-?\d+\.\d+)")
+diffuse_color_pattern = re.compile(rb"diffuseColor[^\S\n]+(-?\d+\.\d+)[^\S\n]+(-?\d+\.\d+)[^\S\n]+(-?\d+\.\d+)")
+dot_block_start_pattern = re.compile(rb"Transform")
+dot_block_end_pattern = re.compile(rb"shininess")
+
+
+def _map_file(wrl_filename):
+        with open(wrl_filename, "rb") as file_object:
+                try:
+                        return mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError: #<-------------------------------------------------------------------- Empty files cannot be memory-mapped
+                        return b""
+
+
+def _line_aligned_chunks(mapped_file, start, end):
+        position = start
+        while position < end:
+                chunk_end = min(position + chunk_size, end)
+                if chunk_end < end:
+                        newline_position = mapped_file.find(b"\n", chunk_end - 1, end)
+                        chunk_end = end if newline_position == -1 else newline_position + 1
+                yield mapped_file[position:chunk_end]
+                position = chunk_end
+
+
+def _triples_to_array(matched_triples):
+        if not matched_triples:
+                return np.empty((0, 3), dtype=np.float64)
+        return np.array(matched_triples).astype(np.float64).reshape(-1, 3)
+
+
+def _line_numbers(chunk, match_positions):
+        newline_positions = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n"))
+        return np.searchsorted(newline_positions, np.asarray(match_positions, dtype=np.int64), side="left")
+
+
+# sb-ReLiEF surfaces: returns (vertex_coordinates, coord_index).  vertex_coordinates is an (N, 3) float64 array of the "x y z," points listed before coordIndex,
+# and coord_index is the int64 array of face indices (with the -1 face separators), empty when the file has none.
+def read_indexed_face_set(wrl_filename):
+        mapped_file = _map_file(wrl_filename)
+        try:
+                coord_index_position = mapped_file.find(b"coordIndex")
+                if coord_index_position == -1:
+                        vertex_region_end = len(mapped_file)
+                else:
+                        vertex_region_end = mapped_file.rfind(b"\n", 0, coord_index_position) + 1 #<---------- The coordIndex line itself is not read for vertices
+                vertex_blocks = [_triples_to_array(vertex_line_pattern.findall(chunk)) for chunk in _line_aligned_chunks(mapped_file, 0, vertex_region_end)]
+                vertex_coordinates = np.concatenate(vertex_blocks) if vertex_blocks else np.empty((0, 3), dtype=np.float64)
+
+                coord_index = np.empty(0, dtype=np.int64)
+                if coord_index_position != -1:
+                        coord_index_match = coord_index_pattern.search(mapped_file, coord_index_position)
+                        if coord_index_match:
+                                coord_index = np.array(re.findall(rb"-?\d+", coord_index_match.group(1))).astype(np.int64)
+        finally:
+                if isinstance(mapped_file, mmap.mmap):
+                        mapped_file.close()
+        return vertex_coordinates, coord_index
+
+
+# Group consecutive vertices into the (N, 9) "vertex_trio" triangle rows used by the sb-ReLiEF slicing.  Trailing vertices that do not complete a trio are dropped.
+def vertex_trio_array(vertex_coordinates):
+        complete_vertex_count = (len(vertex_coordinates) // 3) * 3
+        return np.ascontiguousarray(vertex_coordinates[:complete_vertex_count]).reshape(-1, 9)
+
+
+# db-ReLiEF dot surfaces: returns (dot_coordinates, dot_colors), two (N, 3) float64 arrays with the dot translations and the diffuseColor RGB fractions,
+# in file order.
+def read_dot_surface(wrl_filename):
+        mapped_file = _map_file(wrl_filename)
+        coordinate_blocks = []
+        color_blocks = []
+        new_dot_flag = 0
+        try:
+                for chunk in _line_aligned_chunks(mapped_file, 0, len(mapped_file)):
+                        # A line's block state is set by its own Transform/shininess markers (shininess wins), otherwise it is inherited from the previous marker line.
+                        start_lines = np.unique(_line_numbers(chunk, [match.start() for match in dot_block_start_pattern.finditer(chunk)]))
+                        end_lines = np.unique(_line_numbers(chunk, [match.start() for match in dot_block_end_pattern.finditer(chunk)]))
+                        marker_lines = np.union1d(start_lines, end_lines)
+                        marker_states = np.concatenate(([new_dot_flag], np.where(np.isin(marker_lines, end_lines), 0, 1))) #<------- Entry 0 carries the state over from the previous chunk
+
+                        for data_pattern, data_blocks in ((translation_pattern, coordinate_blocks), (diffuse_color_pattern, color_blocks)):
+                                data_matches = list(data_pattern.finditer(chunk))
+                                if not data_matches:
+                                        continue
+                                data_lines, first_on_line = np.unique(_line_numbers(chunk, [match.start() for match in data_matches]), return_index=True)
+                                accepted = first_on_line[marker_states[np.searchsorted(marker_lines, data_lines, side="right")] == 1]
+                                data_blocks.append(_triples_to_array([data_matches[match_index].groups() for match_index in accepted.tolist()]))
+
+                        new_dot_flag = int(marker_states[-1])
+        finally:
+                if isinstance(mapped_file, mmap.mmap):
+                        mapped_file.close()
+        dot_coordinates = np.concatenate(coordinate_blocks) if coordinate_blocks else np.empty((0, 3), dtype=np.float64)
+        dot_colors = np.concatenate(color_blocks) if color_blocks else np.empty((0, 3), dtype=np.float64)
+        return dot_coordinates, dot_colors
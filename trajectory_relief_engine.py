@@ -0,0 +1,412 @@
+################################################
+# Copyright 2023 Benjamin M. Samudio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Towards Alleviating Suffering
+###############################################
+# Pocket-contact fingerprints of MD trajectory frames (fingerprint_generator_for_PCA_analysis.py).
+#
+# The Ne atom platform grid is moved down through the box in platform_slice_count steps of platform_translation_vector.  In every slice, the grid atoms
+# that clash with the protein (closer than protein_clash_cutoff) are removed, and the remaining grid atoms that are closer than pocket_contact_cutoff to
+# the reference pocket set the bits slice * grid_points_per_slice + j, where j counts the remaining (non-clashing) grid atoms of the slice, as the index
+# into the scoria sub-molecule did.  "Closer than" is the strict cdist(...) < cutoff of scoria's select_close_atoms_from_different_molecules().
+#
+# The pocket contacts do not depend on the frame, so they are found once per run (pocket_contact_mask()).  For every frame the protein is put in a KD-tree
+# and all slices x grid atoms are tested against it in one query; only distances within contact_edge_tolerance of a cutoff are recomputed with cdist(),
+# so the comparison with the cutoff is the same as scoria's to the last bit.
+#
+# Parallel mode.  The trajectory is cut into frame ranges of trajectory_chunk_size frames that run on a pool of worker processes.  Every worker gets its own
+# read-only copy of the slice grid and pocket contact mask when it starts, so no state is shared or moved between frames.  Each range is written to its own
+# chunk file (atomically, via a temporary file), and a range whose chunk file already exists is not computed again, so an interrupted run resumes after
+# the chunks it had finished.  The chunk directory holds a manifest (chunk_manifest_filename) with the digests of the trajectory and topology files, the
+# hashes of the platform grid, pocket and contact mask, the cutoffs, the chunk size and the first frame.  A run whose inputs do not match the manifest
+# refuses to reuse the chunks, so chunks of different inputs are never mixed in one PCA.
+#
+# Frames are streamed from the trajectory in chunks with mdtraj.iterload and handed over as coordinate arrays (Angstrom), with no single_frame.pdb.
+# mdtraj.iterload ignores skip for PDB trajectories (iterload_skip_ignored_extensions); their frames before first_frame are read and dropped here.  The
+# coordinates are rounded to the 3 decimals of a PDB file, so the results are the same as writing the frame with save_pdb and reading it with scoria.
+#
+# PCA.  The per-frame bits (row / column / value) are saved a chunk of frames at a time as sparse CSR chunk files.  The PCA is a randomized truncated SVD
+# of the centered frame matrix that only multiplies the sparse chunks with narrow dense matrices, reading the chunk files once per iteration until the
+# leading variances settle, and the projections are then computed chunk by chunk.  No chunk and no frames x 80,000 matrix is ever made dense, so memory
+# does not grow with the trajectory length.
+import collections
+import concurrent.futures
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import mdtraj as md
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import cdist
+
+from relief_cache import file_content_digest
+from relief_instrumentation import new_instrumentation, instrument_stage, record_stage, add_counter, merge_instrumentation
+
+platform_translation_vector = np.array([0,0,-0.5])
+platform_slice_count = 50
+grid_points_per_slice = 1600 #<----------------------------------------------------------------- Column stride of one slice in the fingerprint (40 x 40 grid)
+protein_clash_cutoff = 1.8
+pocket_contact_cutoff = 0.6
+trajectory_chunk_size = 100 #<------------------------------------------------------------------- Frames read from the trajectory at a time
+pdb_coordinate_decimals = 3
+pending_chunks_per_worker = 2 #<------------------------------------------------------------- Frame ranges queued per worker process
+pca_column_count = platform_slice_count * grid_points_per_slice
+pca_component_count = 2
+contact_edge_tolerance = 1e-9 #<--------------------------------------------------------------- Relative distance window around a cutoff that is recomputed with cdist()
+iterload_skip_ignored_extensions = (".pdb", ".pdb.gz")
+chunk_manifest_filename = "manifest.json"
+
+
+# Yields (frame index, coordinates in Angstrom) for the frames first_frame, first_frame + 1, ..., last_frame (default: the last frame) of a trajectory,
+# reading chunk_size frames at a time.  The frames before first_frame are skipped without being read, except in PDB trajectories, where mdtraj.iterload
+# reads them anyway and they are dropped here.
+def iterate_trajectory_frames(trajectory_file, topology_file, chunk_size=trajectory_chunk_size, first_frame=0, last_frame=None):
+        iterload_skip = 0 if trajectory_file.lower().endswith(iterload_skip_ignored_extensions) else first_frame
+        frame_index = iterload_skip
+        for trajectory_chunk in md.iterload(trajectory_file, top=topology_file, chunk=chunk_size, skip=iterload_skip):
+                chunk_coordinates = np.round((trajectory_chunk.xyz * 10.0).astype(np.float64), pdb_coordinate_decimals) #<------- nm -> Angstrom in float32 and %8.3f, as in save_pdb
+                for chunk_frame in range(trajectory_chunk.n_frames):
+                        if last_frame is not None and frame_index > last_frame:
+                                return
+                        if frame_index >= first_frame:
+                                yield frame_index, chunk_coordinates[chunk_frame]
+                        frame_index += 1
+
+
+# Grid coordinates of every slice (platform_slice_count x grid atoms x 3), translated step by step as platform.translate_molecule() did.
+def platform_slice_coordinates(platform_coordinates, slice_count=platform_slice_count, translation_vector=platform_translation_vector):
+        slice_coordinates = np.empty((slice_count,) + np.shape(platform_coordinates), dtype=np.float64)
+        current_coordinates = np.asarray(platform_coordinates, dtype=np.float64)
+        for slice_index in range(slice_count):
+                current_coordinates = current_coordinates + translation_vector
+                slice_coordinates[slice_index] = current_coordinates
+        return slice_coordinates
+
+
+# Sorted indices of the atoms of first_coordinates that are closer than cutoff to any atom of second_coordinates.
+def close_atom_indices(first_coordinates, second_coordinates, cutoff):
+        if len(first_coordinates) == 0 or len(second_coordinates) == 0:
+                return np.empty(0, dtype=np.int64)
+        return np.unique(np.nonzero(cdist(first_coordinates, second_coordinates) < cutoff)[0])
+
+
+# Boolean mask of the points that are closer than cutoff to any atom of atom_tree (a cKDTree of atom coordinates).  The KD-tree finds the nearest atom;
+# points whose nearest distance lies within contact_edge_tolerance of the cutoff are decided with cdist() over all atoms around them.
+def close_point_mask(points, atom_tree, cutoff):
+        flat_points = np.reshape(points, (-1, 3))
+        if atom_tree.n == 0:
+                return np.zeros(np.shape(points)[:-1], dtype=bool)
+        search_radius = cutoff * (1 + contact_edge_tolerance)
+        nearest_distances = atom_tree.query(flat_points, k=1, distance_upper_bound=search_radius)[0]
+        close_points = nearest_distances < cutoff
+        for point_index in np.flatnonzero(np.abs(nearest_distances - cutoff) <= cutoff * contact_edge_tolerance).tolist():
+                nearby_atoms = atom_tree.query_ball_point(flat_points[point_index], search_radius)
+                close_points[point_index] = bool(len(nearby_atoms)) and bool((cdist(flat_points[point_index:point_index + 1], atom_tree.data[nearby_atoms]) < cutoff).any())
+        return close_points.reshape(np.shape(points)[:-1])
+
+
+# Grid atoms (slices x grid atoms) that touch the reference pocket.  This does not depend on the frame and is computed once per run.
+def pocket_contact_mask(slice_coordinates, pocket_coordinates):
+        return close_point_mask(slice_coordinates, cKDTree(pocket_coordinates), pocket_contact_cutoff)
+
+
+# Fingerprint bit columns (sorted) of one frame.  j is the rank of a grid atom among the grid atoms of its slice that do not clash with the protein.
+def frame_pocket_columns(protein_coordinates, slice_coordinates, contact_mask):
+        grid_avoid_protein = ~close_point_mask(slice_coordinates, cKDTree(protein_coordinates), protein_clash_cutoff)
+        remaining_grid_ranks = np.cumsum(grid_avoid_protein, axis=1) - 1
+        slice_indices, grid_indices = np.nonzero(grid_avoid_protein & contact_mask)
+        return (slice_indices * grid_points_per_slice + remaining_grid_ranks[slice_indices, grid_indices]).tolist()
+
+
+# Slice-by-slice version of frame_pocket_columns() with the same steps as the scoria loop, to check the KD-tree version.
+def frame_pocket_columns_reference(protein_coordinates, slice_coordinates, pocket_coordinates):
+        frame_columns = []
+        for slice_index, grid_coordinates in enumerate(slice_coordinates):
+                grid_avoid_protein = np.delete(grid_coordinates, close_atom_indices(grid_coordinates, protein_coordinates, protein_clash_cutoff), axis=0)
+                close_reference_pocket = close_atom_indices(grid_avoid_protein, pocket_coordinates, pocket_contact_cutoff)
+                frame_columns.extend((slice_index * grid_points_per_slice + close_reference_pocket).tolist())
+        return frame_columns
+
+
+# Both versions must give the same columns, also for atoms placed exactly at the cutoff distances from grid atoms.
+def check_pocket_column_equivalence(frame_count=5, protein_atom_count=2000, seed=7):
+        random_generator = np.random.default_rng(seed)
+        platform_coordinates = np.array([[x_value, y_value, 12.5] for x_value in np.arange(-9.75, 10, 0.5) for y_value in np.arange(-9.75, 10, 0.5)])
+        slice_coordinates = platform_slice_coordinates(platform_coordinates)
+        pocket_coordinates = np.round(random_generator.uniform([-8, -8, -12], [8, 8, 12], (80, 3)), pdb_coordinate_decimals)
+        pocket_coordinates[:10] = slice_coordinates[random_generator.integers(0, platform_slice_count, 10), random_generator.integers(0, len(platform_coordinates), 10)] + [pocket_contact_cutoff, 0, 0]
+        contact_mask = pocket_contact_mask(slice_coordinates, pocket_coordinates)
+        all_frames_equal = True
+        for frame_index in range(frame_count):
+                protein_coordinates = np.round(random_generator.uniform([-10, -10, -14], [10, 10, 14], (protein_atom_count, 3)), pdb_coordinate_decimals)
+                protein_coordinates[:20] = slice_coordinates[random_generator.integers(0, platform_slice_count, 20), random_generator.integers(0, len(platform_coordinates), 20)] + [0, protein_clash_cutoff, 0]
+                frame_columns = frame_pocket_columns(protein_coordinates, slice_coordinates, contact_mask)
+                reference_columns = frame_pocket_columns_reference(protein_coordinates, slice_coordinates, pocket_coordinates)
+                print(f"Frame {frame_index}: {len(frame_columns)} columns, {'same as' if frame_columns == reference_columns else 'DIFFERENT FROM'} the slice-by-slice reference")
+                all_frames_equal = all_frames_equal and frame_columns == reference_columns
+        return all_frames_equal
+
+
+############################################################################################### Streaming PCA
+
+# Sparse frames x pca_column_count matrix of a chunk of frames, one row per entry of frame_indices (frames without bits give empty rows).  row, column and
+# value are the per-frame lists the script collects, with row holding the frame index of every bit.
+def frame_rows_to_csr(frame_indices, row, column, value, column_count=pca_column_count):
+        frame_positions = {frame_index: frame_position for frame_position, frame_index in enumerate(frame_indices)}
+        row_positions = np.array([frame_positions[frame_index] for frame_index in row], dtype=np.int64)
+        return csr_matrix((np.asarray(value, dtype=np.float32), (row_positions, np.asarray(column, dtype=np.int64))), shape=(len(frame_indices), column_count))
+
+
+def frame_chunk_filename(chunk_directory, first_frame, last_frame):
+        return os.path.join(chunk_directory, f"frames_{first_frame:09d}_{last_frame:09d}.npz")
+
+
+def save_frame_chunk(chunk_filename, frame_indices, frame_matrix):
+        np.savez(chunk_filename, frame_indices=np.asarray(frame_indices, dtype=np.int64), row_indptr=frame_matrix.indptr, column_indices=frame_matrix.indices,
+                 values=frame_matrix.data, column_count=np.int64(frame_matrix.shape[1]))
+
+
+# (frame indices, sparse frame matrix) of a chunk file.
+def load_frame_chunk(chunk_filename):
+        with np.load(chunk_filename, allow_pickle=False) as chunk_file:
+                frame_indices = chunk_file["frame_indices"]
+                frame_matrix = csr_matrix((chunk_file["values"], chunk_file["column_indices"], chunk_file["row_indptr"]), shape=(len(frame_indices), int(chunk_file["column_count"])))
+        return frame_indices, frame_matrix
+
+
+# Chunk files of a directory in frame order.
+def list_frame_chunks(chunk_directory):
+        return sorted(glob.glob(os.path.join(chunk_directory, "frames_*_*.npz")))
+
+
+# Centered Gram product (X - mean)^T (X - mean) @ basis over all chunks, from the sparse rows: X^T (X @ basis) - frame_count * mean (mean^T @ basis).
+def _centered_gram_product(frame_chunks, basis, column_mean, frame_count):
+        gram_product = np.zeros(basis.shape, dtype=np.float64)
+        for frame_matrix in frame_chunks:
+                gram_product += np.asarray(frame_matrix.T @ np.asarray(frame_matrix @ basis))
+        return gram_product - frame_count * np.outer(column_mean, column_mean @ basis)
+
+
+# PCA of the sparse frame rows with a randomized subspace iteration (Halko, Martinsson and Tropp), reading the chunks once for the mean and once per
+# iteration.  The iteration stops once the relative change of the n_components largest Ritz values is below ritz_tolerance, or after power_iterations.
+# The Ritz values converge about twice as fast as the components, hence the small tolerance: fingerprint frames often have a small gap between the
+# leading variances (see check_streaming_pca_against_dense()).  chunk_source() must return a new iterator over the sparse chunk matrices each time it is
+# called (for example the chunk files).  Memory is pca_column_count x (n_components + oversampling) numbers plus one sparse chunk.  Returns a dict with
+# mean, components (n_components x columns, the largest loading of each component positive), explained_variance, frame_count and power_iterations (the
+# number of iterations run).
+def fit_streaming_pca(chunk_source, n_components=pca_component_count, oversampling=10, power_iterations=50, seed=0, ritz_tolerance=1e-10):
+        frame_count = 0
+        column_sum = None
+        for frame_matrix in chunk_source():
+                chunk_column_sum = np.asarray(frame_matrix.sum(axis=0)).ravel()
+                column_sum = chunk_column_sum if column_sum is None else column_sum + chunk_column_sum
+                frame_count += frame_matrix.shape[0]
+        if frame_count < 2:
+                raise ValueError(f"PCA needs at least 2 frames, got {frame_count}")
+        column_mean = column_sum / frame_count
+        sketch_width = min(n_components + oversampling, len(column_mean))
+        basis = np.linalg.qr(np.random.default_rng(seed).standard_normal((len(column_mean), sketch_width)))[0]
+        previous_ritz_values = None
+        for power_iteration in range(power_iterations + 1):
+                gram_product = _centered_gram_product(chunk_source(), basis, column_mean, frame_count)
+                eigenvalues, eigenvectors = np.linalg.eigh(basis.T @ gram_product) #<---------------------- Rayleigh-Ritz on the current basis
+                component_order = np.argsort(eigenvalues)[::-1][:n_components]
+                ritz_values = eigenvalues[component_order]
+                if previous_ritz_values is not None and np.all(np.abs(ritz_values - previous_ritz_values) <= ritz_tolerance * np.abs(ritz_values[0])):
+                        break
+                previous_ritz_values = ritz_values
+                if power_iteration < power_iterations:
+                        basis = np.linalg.qr(gram_product)[0]
+        components = (basis @ eigenvectors[:, component_order]).T
+        components *= np.sign(components[np.arange(len(components)), np.argmax(np.abs(components), axis=1)])[:, None]
+        return {"mean": column_mean, "components": components, "explained_variance": np.maximum(ritz_values, 0) / (frame_count - 1), "frame_count": frame_count,
+                "power_iterations": power_iteration}
+
+
+# Projections (frames x n_components) of one chunk of sparse frame rows, computed on the sparse rows: (X - mean) @ components.T = X @ components.T - mean @ components.T.
+def project_frame_chunk(pca_model, frame_matrix):
+        return np.asarray(frame_matrix @ pca_model["components"].T) - pca_model["mean"] @ pca_model["components"].T
+
+
+############################################################################################### Parallel trajectory mode
+
+_worker_platform = {}
+
+
+def _initialize_trajectory_worker(slice_coordinates, contact_mask):
+        slice_coordinates.setflags(write=False)
+        contact_mask.setflags(write=False)
+        _worker_platform["slice_coordinates"] = slice_coordinates
+        _worker_platform["contact_mask"] = contact_mask
+
+
+# Fingerprint the frames first_frame to last_frame and save them as one chunk file.  This runs inside the worker processes.  With an instrumentation record
+# (see relief_instrumentation.py) the parse (frame reading), slice (clash and contact tests), bin and write stages are timed and the frames and bits counted.
+def fingerprint_frame_range(trajectory_file, topology_file, first_frame, last_frame, chunk_filename, instrumentation=None):
+        chunk_frames, chunk_row, chunk_column, chunk_value = [], [], [], []
+        parse_seconds = 0.0
+        slice_seconds = 0.0
+        stage_start_time = time.perf_counter()
+        for frame, protein_coordinates in iterate_trajectory_frames(trajectory_file, topology_file, last_frame - first_frame + 1, first_frame, last_frame):
+                parse_seconds += time.perf_counter() - stage_start_time
+                stage_start_time = time.perf_counter()
+                column = frame_pocket_columns(protein_coordinates, _worker_platform["slice_coordinates"], _worker_platform["contact_mask"])
+                slice_seconds += time.perf_counter() - stage_start_time
+                chunk_frames.append(frame)
+                chunk_row += [frame] * len(column)
+                chunk_column += column
+                chunk_value += [1] * len(column)
+                stage_start_time = time.perf_counter()
+        parse_seconds += time.perf_counter() - stage_start_time
+        record_stage(instrumentation, "parse", parse_seconds, len(chunk_frames))
+        record_stage(instrumentation, "slice", slice_seconds, len(chunk_frames) * len(_worker_platform["slice_coordinates"]))
+        with instrument_stage(instrumentation, "bin", len(chunk_column)):
+                frame_matrix = frame_rows_to_csr(chunk_frames, chunk_row, chunk_column, chunk_value)
+        temporary_filename = chunk_filename + ".tmp"
+        with instrument_stage(instrumentation, "write"):
+                with open(temporary_filename, "wb") as file_object:
+                        save_frame_chunk(file_object, chunk_frames, frame_matrix)
+                os.replace(temporary_filename, chunk_filename)
+        add_counter(instrumentation, "frames", len(chunk_frames))
+        add_counter(instrumentation, "set_bits", len(chunk_column))
+        add_counter(instrumentation, "chunks_written")
+        return chunk_filename
+
+
+# fingerprint_frame_range() with its own instrumentation record, which is sent back to the main process with the chunk filename.
+def _fingerprint_frame_range_instrumented(trajectory_file, topology_file, first_frame, last_frame, chunk_filename, track_memory):
+        instrumentation = new_instrumentation("pca", track_memory)
+        return fingerprint_frame_range(trajectory_file, topology_file, first_frame, last_frame, chunk_filename, instrumentation), instrumentation
+
+
+def _array_digest(coordinate_array):
+        coordinate_array = np.ascontiguousarray(coordinate_array)
+        return hashlib.sha256(str(coordinate_array.dtype).encode("utf-8") + str(coordinate_array.shape).encode("utf-8") + coordinate_array.tobytes()).hexdigest()
+
+
+# Everything the chunk files of a run depend on (written to the chunk directory as its manifest).
+def chunk_manifest(trajectory_file, topology_file, slice_coordinates, contact_mask, chunk_size, first_frame, pocket_coordinates=None):
+        return {"trajectory_digest": file_content_digest(trajectory_file), "topology_digest": file_content_digest(topology_file),
+                "platform_digest": _array_digest(np.asarray(slice_coordinates, dtype=np.float64)), "contact_mask_digest": _array_digest(np.asarray(contact_mask, dtype=bool)),
+                "pocket_digest": None if pocket_coordinates is None else _array_digest(np.asarray(pocket_coordinates, dtype=np.float64)),
+                "protein_clash_cutoff": protein_clash_cutoff, "pocket_contact_cutoff": pocket_contact_cutoff, "pdb_coordinate_decimals": pdb_coordinate_decimals,
+                "column_count": pca_column_count, "chunk_size": chunk_size, "first_frame": first_frame}
+
+
+# Write the manifest into a new chunk directory, or check it against the manifest of the chunks already there.  Raises ValueError when the chunks were made
+# from other inputs (or when there are chunks without a manifest), since reusing them would mix frames of different runs.
+def claim_chunk_directory(chunk_directory, manifest):
+        manifest_filename = os.path.join(chunk_directory, chunk_manifest_filename)
+        if os.path.exists(manifest_filename):
+                with open(manifest_filename) as file_object:
+                        chunk_directory_manifest = json.load(file_object)
+                mismatched_entries = sorted(manifest_key for manifest_key in set(manifest) | set(chunk_directory_manifest) if manifest.get(manifest_key) != chunk_directory_manifest.get(manifest_key))
+                if mismatched_entries:
+                        raise ValueError(f"The chunks in {chunk_directory} were made from other inputs ({', '.join(mismatched_entries)} differ); use another chunk directory or empty this one")
+                return
+        if list_frame_chunks(chunk_directory):
+                raise ValueError(f"{chunk_directory} holds chunk files without a {chunk_manifest_filename}; use another chunk directory or empty this one")
+        temporary_filename = manifest_filename + ".tmp"
+        with open(temporary_filename, 'w') as file_object:
+                json.dump(manifest, file_object, indent=1, sort_keys=True)
+        os.replace(temporary_filename, manifest_filename)
+
+
+# (first frame, last frame) of every chunk of chunk_size frames, from first_frame to the end of the trajectory.
+def trajectory_frame_ranges(trajectory_file, chunk_size=trajectory_chunk_size, first_frame=0):
+        with md.open(trajectory_file) as trajectory_handle:
+                frame_count = len(trajectory_handle)
+        return [(range_start, min(range_start + chunk_size, frame_count) - 1) for range_start in range(first_frame, frame_count, chunk_size)]
+
+
+# Fingerprint a whole trajectory into chunk files on a pool of worker processes (workers=None uses one per CPU core, workers=1 runs in this process).
+# Yields the chunk filenames in frame order as they become available; chunks that already exist are yielded without being computed, after the manifest of
+# the chunk directory was checked (claim_chunk_directory(); pass pocket_coordinates to have the pocket in it too).  The stages and counters of the workers
+# are merged into instrumentation, if given, as their chunks arrive.
+def fingerprint_trajectory_chunks(trajectory_file, topology_file, slice_coordinates, contact_mask, chunk_directory, chunk_size=trajectory_chunk_size, first_frame=0, workers=None, instrumentation=None,
+                                  pocket_coordinates=None):
+        workers = workers or os.cpu_count() or 1
+        os.makedirs(chunk_directory, exist_ok=True)
+        claim_chunk_directory(chunk_directory, chunk_manifest(trajectory_file, topology_file, slice_coordinates, contact_mask, chunk_size, first_frame, pocket_coordinates))
+        frame_ranges = iter(trajectory_frame_ranges(trajectory_file, chunk_size, first_frame))
+        if workers == 1:
+                _initialize_trajectory_worker(np.array(slice_coordinates), np.array(contact_mask))
+        executor_context = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_initialize_trajectory_worker, initargs=(slice_coordinates, contact_mask)) if workers > 1 else contextlib.nullcontext()
+
+        def start_range(executor, range_start, range_end):
+                chunk_filename = frame_chunk_filename(chunk_directory, range_start, range_end)
+                if os.path.exists(chunk_filename):
+                        add_counter(instrumentation, "chunks_reused")
+                        return chunk_filename
+                if executor is None:
+                        return fingerprint_frame_range(trajectory_file, topology_file, range_start, range_end, chunk_filename, instrumentation)
+                if instrumentation is not None:
+                        return executor.submit(_fingerprint_frame_range_instrumented, trajectory_file, topology_file, range_start, range_end, chunk_filename, instrumentation["track_memory"])
+                return executor.submit(fingerprint_frame_range, trajectory_file, topology_file, range_start, range_end, chunk_filename)
+
+        with executor_context as executor:
+                pending_chunks = collections.deque()
+                for range_start, range_end in frame_ranges:
+                        pending_chunks.append(start_range(executor, range_start, range_end))
+                        if len(pending_chunks) >= workers * pending_chunks_per_worker:
+                                break
+                while pending_chunks:
+                        chunk_result = pending_chunks.popleft()
+                        if isinstance(chunk_result, concurrent.futures.Future):
+                                chunk_result = chunk_result.result()
+                        if isinstance(chunk_result, tuple):
+                                chunk_result, worker_instrumentation = chunk_result
+                                merge_instrumentation(instrumentation, worker_instrumentation)
+                        yield chunk_result
+                        next_range = next(frame_ranges, None)
+                        if next_range is not None:
+                                pending_chunks.append(start_range(executor, *next_range))
+
+# fit_streaming_pca() and project_frame_chunk() against a dense PCA (the SVD of the centered frame matrix, as sklearn.decomposition.PCA with the "full"
+# solver) of the synthetic trajectory of relief_synthetic_inputs.py, fingerprinted from frame 1.  The projections are compared up to the sign of each component.
+def check_streaming_pca_against_dense(frame_count=37, chunk_size=10, projection_tolerance=1e-4, variance_tolerance=1e-6):
+        import tempfile
+        from relief_synthetic_inputs import write_synthetic_trajectory
+        with tempfile.TemporaryDirectory() as trajectory_directory:
+                trajectory_files = write_synthetic_trajectory(trajectory_directory, frame_count)
+                slice_coordinates = platform_slice_coordinates(md.load(trajectory_files["grid"]).xyz[0] * 10.0)
+                pocket_coordinates = md.load(trajectory_files["pocket"]).xyz[0] * 10.0
+                chunk_filenames = list(fingerprint_trajectory_chunks(trajectory_files["trajectory"], trajectory_files["topology"], slice_coordinates, pocket_contact_mask(slice_coordinates, pocket_coordinates),
+                                                                     os.path.join(trajectory_directory, "chunks"), chunk_size, first_frame=1, workers=1, pocket_coordinates=pocket_coordinates))
+                frame_chunks = [load_frame_chunk(chunk_filename)[1] for chunk_filename in chunk_filenames]
+        pca_model = fit_streaming_pca(lambda: iter(frame_chunks))
+        projections = np.concatenate([project_frame_chunk(pca_model, frame_matrix) for frame_matrix in frame_chunks])
+        dense_frame_matrix = np.concatenate([frame_matrix.toarray() for frame_matrix in frame_chunks]).astype(np.float64)
+        left_vectors, singular_values = np.linalg.svd(dense_frame_matrix - dense_frame_matrix.mean(axis=0), full_matrices=False)[:2]
+        component_count = len(pca_model["components"])
+        dense_projections = left_vectors[:, :component_count] * singular_values[:component_count]
+        dense_projections *= np.sign((projections * dense_projections).sum(axis=0))
+        dense_explained_variance = singular_values[:component_count] ** 2 / (len(dense_frame_matrix) - 1)
+        projection_difference = np.abs(projections - dense_projections).max()
+        variance_difference = np.abs(pca_model["explained_variance"] / dense_explained_variance - 1).max()
+        print(f"Streaming PCA of {pca_model['frame_count']} frames ({pca_model['power_iterations']} power iterations): projections within {projection_difference:.2e} "
+              f"(largest |PC| {np.abs(dense_projections).max():.2f}), explained variance within {variance_difference:.2e} (relative) of the dense PCA")
+        return projection_difference <= projection_tolerance and variance_difference <= variance_tolerance
+
+
+if __name__ == "__main__":
+        pocket_columns_equal = check_pocket_column_equivalence()
+        streaming_pca_matches = check_streaming_pca_against_dense()
+        raise SystemExit(0 if pocket_columns_equal and streaming_pca_matches else 1)